@@ -4,15 +4,91 @@ import time
 import asyncio
 import json
 import re
+import struct
+import hmac
+import hashlib
+import orjson
 import requests
+import msgspec
 import numpy as np
-from pybit.unified_trading import HTTP
+from urllib.parse import urlencode
+from collections import OrderedDict
+from dataclasses import dataclass
 from datetime import datetime
 import talib
+# stream-варианты считают только последнее значение индикатора
+# вместо всего ряда с выбросом всего, кроме [-1]
+from talib import stream as ta_stream
 import aiohttp
 from dotenv import load_dotenv
 import sys
 
+# numba опционален: с ним ATR считается скалярным ядром без аллокации
+# выходного массива, без него остаётся путь через talib
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+if HAS_NUMBA:
+    @njit(cache=True, fastmath=True)
+    def atr_last(high, low, close, n):
+        """Последнее значение ATR по Уайлдеру одним проходом, без буфера на весь ряд"""
+        tr_sum = 0.0
+        for i in range(1, n + 1):
+            tr = max(high[i] - low[i], abs(high[i] - close[i - 1]), abs(low[i] - close[i - 1]))
+            tr_sum += tr
+        atr = tr_sum / n
+        for i in range(n + 1, high.size):
+            tr = max(high[i] - low[i], abs(high[i] - close[i - 1]), abs(low[i] - close[i - 1]))
+            atr = (atr * (n - 1) + tr) / n
+        return atr
+
+    @njit(cache=True)
+    def _pivot_scan(c):
+        """Последние локальные максимум и минимум ряда (NaN, если не найдены)"""
+        last_high = np.nan
+        last_low = np.nan
+        for i in range(1, c.shape[0] - 1):
+            if c[i] > c[i - 1] and c[i] > c[i + 1]:
+                last_high = c[i]
+            if c[i] < c[i - 1] and c[i] < c[i + 1]:
+                last_low = c[i]
+        return last_high, last_low
+
+    @njit(cache=True, fastmath=True)
+    def _trail_compute(is_buy, price, cur, trail):
+        """Новый трейлинг-стоп и флаг «двигать ли»: чистая арифметика без боксинга"""
+        new_stop = price * trail
+        if is_buy:
+            ok = new_stop > cur and (new_stop - cur) / cur * 100.0 >= 0.1
+        else:
+            ok = new_stop < cur and (cur - new_stop) / cur * 100.0 >= 0.1
+        return new_stop, ok
+else:
+    def _pivot_scan(c):
+        """Фолбэк без numba: пивоты срезами и масками, циклы остаются в C"""
+        if c.shape[0] < 3:
+            return np.nan, np.nan
+        mid = c[1:-1]
+        prev = c[:-2]
+        nxt = c[2:]
+        highs = mid[(mid > prev) & (mid > nxt)]
+        lows = mid[(mid < prev) & (mid < nxt)]
+        last_high = highs[-1] if highs.size else np.nan
+        last_low = lows[-1] if lows.size else np.nan
+        return last_high, last_low
+
+    def _trail_compute(is_buy, price, cur, trail):
+        """Фолбэк без numba: та же арифметика трейлинг-стопа на чистом Python"""
+        new_stop = price * trail
+        if is_buy:
+            ok = new_stop > cur and (new_stop - cur) / cur * 100.0 >= 0.1
+        else:
+            ok = new_stop < cur and (cur - new_stop) / cur * 100.0 >= 0.1
+        return new_stop, ok
+
 # ✅ Исправление ошибки для aiodns на Windows
 if sys.platform == "win32":
     asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
@@ -20,6 +96,29 @@ if sys.platform == "win32":
 # ======================== Загрузка конфигурации ========================
 load_dotenv()  # Загружаем переменные из .env
 
+@dataclass(frozen=True, slots=True)
+class Config:
+    """Валидированная конфигурация: атрибуты читаются через C-слоты, без dict-лукапов"""
+    symbol: str
+    leverage: int
+    min_leverage: int
+    max_leverage: int
+    risk_percentage: float
+    max_daily_trades: int
+
+def _sync_telegram(message):
+    """Синхронная отправка в Telegram для фатального пути: цикл событий ещё не запущен"""
+    try:
+        token = os.getenv("TELEGRAM_BOT_TOKEN")
+        chat_id = os.getenv("TELEGRAM_CHAT_ID")
+        requests.post(
+            f"https://api.telegram.org/bot{token}/sendMessage",
+            data={"chat_id": chat_id, "text": message},
+            timeout=5
+        )
+    except Exception as e:
+        logging.error("Ошибка отправки Telegram-сообщения: %s", e)
+
 def validate_config():
     """
     Проверяет корректность конфигурации и останавливает бота при критических ошибках
@@ -68,29 +167,30 @@ def validate_config():
         error_message = "🚫 Критические ошибки конфигурации:\n" + "\n".join(f"- {error}" for error in critical_errors)
         print(error_message)
         if os.getenv("TELEGRAM_BOT_TOKEN") and os.getenv("TELEGRAM_CHAT_ID"):
-            # Используем asyncio.run для вызова асинхронной функции из синхронного кода
-            asyncio.run(send_telegram_message(error_message))
+            # Отправляем синхронно: поднимать event loop ради одного сообщения
+            # перед sys.exit незачем
+            _sync_telegram(error_message)
         sys.exit(1)
     
-    return {
-        "symbol": symbol,
-        "leverage": leverage,
-        "min_leverage": min_leverage,
-        "max_leverage": max_leverage,
-        "risk_percentage": risk_percentage,
-        "max_daily_trades": max_daily_trades
-    }
+    return Config(
+        symbol=symbol,
+        leverage=leverage,
+        min_leverage=min_leverage,
+        max_leverage=max_leverage,
+        risk_percentage=risk_percentage,
+        max_daily_trades=max_daily_trades
+    )
 
 # Валидируем конфигурацию при запуске
 config = validate_config()
 
 # Используем валидированные значения
-SYMBOL = config["symbol"]
-LEVERAGE = config["leverage"]
-MIN_LEVERAGE = config["min_leverage"]
-MAX_LEVERAGE = config["max_leverage"]
-RISK_PERCENTAGE = config["risk_percentage"]
-MAX_DAILY_TRADES = config["max_daily_trades"]
+SYMBOL = config.symbol
+LEVERAGE = config.leverage
+MIN_LEVERAGE = config.min_leverage
+MAX_LEVERAGE = config.max_leverage
+RISK_PERCENTAGE = config.risk_percentage
+MAX_DAILY_TRADES = config.max_daily_trades
 
 # Остальные параметры конфигурации
 TESTNET = os.getenv("TESTNET", "True").lower() == "true"
@@ -108,6 +208,18 @@ TAKE_PROFIT_2 = float(os.getenv("TAKE_PROFIT_2", 0.6))
 TAKE_PROFIT_3 = float(os.getenv("TAKE_PROFIT_3", 1.0))
 TRAILING_STOP = float(os.getenv("TRAILING_STOP", 0.2))
 
+# Множители целей и трейлинга считаем один раз при старте:
+# в горячем цикле остаётся только умножение на цену
+_TP_BUY = (1 + TAKE_PROFIT_1 / 100, 1 + TAKE_PROFIT_2 / 100, 1 + TAKE_PROFIT_3 / 100)
+_TP_SELL = (1 - TAKE_PROFIT_1 / 100, 1 - TAKE_PROFIT_2 / 100, 1 - TAKE_PROFIT_3 / 100)
+_TRAIL_BUY = 1 - TRAILING_STOP / 100
+_TRAIL_SELL = 1 + TRAILING_STOP / 100
+
+# Режимы волатильности: пороги atr/price и интервал между ордерами (сек)
+# для каждого режима; выбор через searchsorted вместо каскада веток
+_VOL_THRESHOLDS = np.array([0.005, 0.01, 0.02])
+_VOL_INTERVALS = np.array([180, 300, 600, 900])
+
 # Параметры стоп-лосса
 STOP_LOSS_PERCENTAGE = float(os.getenv("STOP_LOSS_PERCENTAGE", 0.3))
 ATR_MULTIPLIER = float(os.getenv("ATR_MULTIPLIER", 2.0))
@@ -120,6 +232,9 @@ VWAP_PERIOD = int(os.getenv("VWAP_PERIOD", 20))
 
 CHECK_INTERVAL = int(os.getenv("CHECK_INTERVAL", 5))
 
+# Смещение локального времени в секундах для целочисленного номера дня
+LOCAL_TZ_OFFSET = time.localtime().tm_gmtoff
+
 # Минимальные размеры позиций для разных пар
 MIN_POSITION_SIZES = {
     "BTCUSDT": 0.001,
@@ -148,6 +263,39 @@ MIN_STOP_DISTANCES = {
     "AVAXUSDT": 0.2
 }
 
+# Точность цены и объёма по парам: биржа ждёт строки, выровненные по тик-сайзу
+PRICE_FMT = {
+    "BTCUSDT": ".2f",
+    "ETHUSDT": ".2f",
+    "SOLUSDT": ".3f",
+    "XRPUSDT": ".4f",
+    "ADAUSDT": ".4f",
+    "DOGEUSDT": ".5f",
+    "MATICUSDT": ".4f",
+    "LINKUSDT": ".3f",
+    "UNIUSDT": ".3f",
+    "AVAXUSDT": ".3f"
+}
+QTY_FMT = {
+    "BTCUSDT": ".3f",
+    "ETHUSDT": ".2f",
+    "SOLUSDT": ".1f",
+    "XRPUSDT": ".0f",
+    "ADAUSDT": ".0f",
+    "DOGEUSDT": ".0f",
+    "MATICUSDT": ".0f",
+    "LINKUSDT": ".1f",
+    "UNIUSDT": ".1f",
+    "AVAXUSDT": ".1f"
+}
+
+# Символ на процесс один, поэтому значения для него фиксируем один раз,
+# а не лезем в словарь на каждом размещении ордера
+SYMBOL_MIN_POS = MIN_POSITION_SIZES.get(SYMBOL, 0.002)
+SYMBOL_MIN_STOP = MIN_STOP_DISTANCES.get(SYMBOL, 0.1)
+SYMBOL_PRICE_FMT = PRICE_FMT.get(SYMBOL, ".2f")
+SYMBOL_QTY_FMT = QTY_FMT.get(SYMBOL, ".3f")
+
 # ======================== Настройка логирования ========================
 logging.basicConfig(
     level=logging.INFO,
@@ -158,55 +306,75 @@ logging.basicConfig(
     ]
 )
 
+# MessagePack-хранилище: msgspec сериализует в разы быстрее stdlib json,
+# а 4-байтовый big-endian заголовок длины позволяет дописывать записи в хвост
+_MSGPACK_ENCODER = msgspec.msgpack.Encoder()
+_MSGPACK_DECODER = msgspec.msgpack.Decoder()
+_LEN_HEADER = struct.Struct(">I")
+
+def _storage_path(filename: str) -> str:
+    """Преобразует старое имя *.json в фактический путь *.msgpack"""
+    if filename.endswith('.json'):
+        return filename[:-len('.json')] + '.msgpack'
+    return filename
+
+def _pack_payload(data: dict) -> bytes:
+    """Кодирует данные в msgpack с заголовком длины"""
+    payload = _MSGPACK_ENCODER.encode(data)
+    return _LEN_HEADER.pack(len(payload)) + payload
+
 def update_json_file(filename: str, data: dict) -> bool:
-    """Обновляет JSON файл с данными"""
+    """Обновляет msgpack-файл с данными"""
     try:
         # Добавляем временную метку обновления
         if isinstance(data, dict):
             data["last_updated"] = datetime.now().isoformat()
-        
+
+        path = _storage_path(filename)
+
         # Создаем временный файл
-        temp_filename = f"{filename}.tmp"
-        
+        temp_filename = f"{path}.tmp"
+
         # Записываем во временный файл
-        with open(temp_filename, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-        
+        with open(temp_filename, 'wb') as f:
+            f.write(_pack_payload(data))
+
         # Проверяем, что файл создался и не пустой
         if os.path.exists(temp_filename) and os.path.getsize(temp_filename) > 0:
             # Если всё в порядке, переименовываем временный файл
-            if os.path.exists(filename):
-                os.replace(temp_filename, filename)
+            if os.path.exists(path):
+                os.replace(temp_filename, path)
             else:
-                os.rename(temp_filename, filename)
-            
-            logging.info(f"✅ Данные успешно записаны в {filename}")
+                os.rename(temp_filename, path)
+
+            logging.info("✅ Данные успешно записаны в %s", filename)
             return True
         else:
-            logging.error(f"❌ Временный файл {temp_filename} не создан или пуст")
+            logging.error("❌ Временный файл %s не создан или пуст", temp_filename)
             if os.path.exists(temp_filename):
                 os.remove(temp_filename)
             return False
-            
+
     except Exception as e:
-        logging.error(f"❌ Ошибка записи в {filename}: {e}")
-        logging.error(f"❌ Тип ошибки: {type(e).__name__}")
+        logging.error("❌ Ошибка записи в %s: %s", filename, e)
+        logging.error("❌ Тип ошибки: %s", type(e).__name__)
         import traceback
-        logging.error(f"❌ Трейсбек: {traceback.format_exc()}")
-        
+        logging.error("❌ Трейсбек: %s", traceback.format_exc())
+
         # Удаляем временный файл, если он существует
         if os.path.exists(temp_filename):
             os.remove(temp_filename)
         return False
 
 def read_json_file(filename: str) -> dict:
-    """Читает данные из JSON файла"""
+    """Читает данные из msgpack-файла"""
     try:
-        with open(filename, 'r') as f:
-            return json.load(f)
+        with open(_storage_path(filename), 'rb') as f:
+            raw = f.read()
+        return _MSGPACK_DECODER.decode(raw[_LEN_HEADER.size:])
     except FileNotFoundError:
         return {}
-    except json.JSONDecodeError:
+    except msgspec.DecodeError:
         return {}
 
 def check_signals() -> bool:
@@ -219,9 +387,37 @@ def check_signals() -> bool:
             return True
         return False
     except Exception as e:
-        logging.error(f"Ошибка при проверке сигналов: {e}")
+        logging.error("Ошибка при проверке сигналов: %s", e)
         return False
 
+# ======================== Общая HTTP-сессия ========================
+# Одна сессия на процесс: соединения и DNS-кэш переиспользуются всеми
+# запросами вместо TCP+TLS-рукопожатия на каждое Telegram-уведомление
+HTTP_SESSION = None
+
+def get_http_session():
+    """Возвращает общую aiohttp-сессию, создавая её при первом обращении"""
+    global HTTP_SESSION
+    if HTTP_SESSION is None or HTTP_SESSION.closed:
+        HTTP_SESSION = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=30),
+            connector=aiohttp.TCPConnector(
+                limit=100,
+                limit_per_host=32,
+                ttl_dns_cache=600,
+                keepalive_timeout=60,
+                enable_cleanup_closed=True
+            )
+        )
+    return HTTP_SESSION
+
+async def close_http_session():
+    """Закрывает общую HTTP-сессию при остановке бота"""
+    global HTTP_SESSION
+    if HTTP_SESSION is not None and not HTTP_SESSION.closed:
+        await HTTP_SESSION.close()
+        HTTP_SESSION = None
+
 # ======================== Функции для работы с Telegram ========================
 async def send_telegram_message(message):
     """
@@ -230,34 +426,114 @@ async def send_telegram_message(message):
     if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
         logging.warning("Не заданы переменные для Telegram бота")
         return
-        
+
     url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
     data = {"chat_id": TELEGRAM_CHAT_ID, "text": message}
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url, data=data) as response:
-            if response.status != 200:
-                logging.error(f"Ошибка отправки Telegram-сообщения: {await response.text()}")
+    async with get_http_session().post(url, data=data) as response:
+        if response.status != 200:
+            logging.error("Ошибка отправки Telegram-сообщения: %s", await response.text())
 
 class BybitAPI:
     """
-    Класс для работы с API Bybit с контролем частоты запросов
+    Класс для работы с Bybit v5 REST API через aiohttp с контролем частоты запросов
     """
-    def __init__(self, session, min_request_interval=1.0):
-        self.session = session
-        self.min_request_interval = min_request_interval
-        self.last_request_time = 0
-        self.rate_limit_retries = 3
-        self.rate_limit_delay = 60  # секунды
+    BASE_URL = "https://api-testnet.bybit.com" if TESTNET else "https://api.bybit.com"
+    RECV_WINDOW = "5000"
 
-    async def _wait_for_rate_limit(self):
-        """Ожидание между запросами"""
-        current_time = time.time()
-        time_since_last_request = current_time - self.last_request_time
-        if time_since_last_request < self.min_request_interval:
-            await asyncio.sleep(self.min_request_interval - time_since_last_request)
-        self.last_request_time = time.time()
+    REQUESTS_PER_SECOND = 10  # лимит Bybit на IP
+    MAX_IN_FLIGHT = 20
+
+    def __init__(self):
+        self.api_key = os.getenv("BYBIT_API_KEY", "")
+        self.api_secret = os.getenv("BYBIT_API_SECRET", "")
+        self.rate_limit_retries = 3
+        # Ключ HMAC разворачивается один раз; на запрос хэшер только копируется
+        self._signer = hmac.new(self.api_secret.encode(), b"", hashlib.sha256)
+        # Семафор ограничивает одновременные запросы, токен-бакет — их темп.
+        # В отличие от одного общего интервала это не сериализует gather-пачки
+        self._sem = asyncio.Semaphore(self.MAX_IN_FLIGHT)
+        self._bucket = asyncio.Queue(maxsize=self.REQUESTS_PER_SECOND)
+        self._refill_task = None
+        self._cache = {}  # key -> (expiry, value) для ответов с коротким TTL
+
+    async def _cached(self, key, ttl, coro_factory):
+        """Возвращает ответ из кэша, пока не истёк TTL, иначе запрашивает заново"""
+        now = time.monotonic()
+        entry = self._cache.get(key)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+        value = await coro_factory()
+        if value is not None:
+            self._cache[key] = (now + ttl, value)
+        return value
+
+    async def _acquire_token(self):
+        """Берёт токен из бакета, при первом обращении запускает пополнение"""
+        if self._refill_task is None:
+            self._refill_task = asyncio.create_task(self._refill_bucket())
+        await self._bucket.get()
+
+    async def _refill_bucket(self):
+        """Пополняет токен-бакет с темпом REQUESTS_PER_SECOND"""
+        interval = 1.0 / self.REQUESTS_PER_SECOND
+        while True:
+            try:
+                self._bucket.put_nowait(None)
+            except asyncio.QueueFull:
+                pass
+            await asyncio.sleep(interval)
+
+    def _signed_headers(self, payload: bytes):
+        """Формирует заголовки с HMAC-SHA256 подписью для приватных эндпоинтов"""
+        timestamp = str(int(time.time() * 1000))
+        h = self._signer.copy()
+        h.update(f"{timestamp}{self.api_key}{self.RECV_WINDOW}".encode() + payload)
+        return {
+            "X-BAPI-API-KEY": self.api_key,
+            "X-BAPI-TIMESTAMP": timestamp,
+            "X-BAPI-RECV-WINDOW": self.RECV_WINDOW,
+            "X-BAPI-SIGN": h.hexdigest()
+        }
 
-    async def _handle_api_error(self, response, retry_count=0):
+    async def _get(self, path, params, signed=False):
+        """GET-запрос к v5 REST: строка запроса подписывается для приватных эндпоинтов"""
+        query = urlencode(params)
+        url = f"{self.BASE_URL}{path}?{query}"
+        for attempt in range(self.rate_limit_retries + 1):
+            async with self._sem:
+                await self._acquire_token()
+                # Подпись содержит timestamp, поэтому пересчитываем её на каждую попытку
+                headers = self._signed_headers(query.encode()) if signed else None
+                async with get_http_session().get(url, headers=headers) as response:
+                    # orjson разбирает ответы с массами float-строк в разы
+                    # быстрее стандартного json — это каждый HTTP-вызов бота
+                    data = await response.json(loads=orjson.loads)
+            if data.get("retCode") == 10006 and attempt < self.rate_limit_retries:
+                delay = min(2 ** attempt, 30)
+                logging.warning("Превышен лимит запросов. Повтор через %s с...", delay)
+                await asyncio.sleep(delay)
+                continue
+            return data
+
+    async def _post(self, path, params):
+        """POST-запрос к v5 REST: все POST-эндпоинты приватные, подписываем тело"""
+        body = orjson.dumps(params)
+        url = f"{self.BASE_URL}{path}"
+        for attempt in range(self.rate_limit_retries + 1):
+            async with self._sem:
+                await self._acquire_token()
+                headers = self._signed_headers(body)
+                headers["Content-Type"] = "application/json"
+                async with get_http_session().post(url, data=body, headers=headers) as response:
+                    data = await response.json(loads=orjson.loads)
+            if data.get("retCode") == 10006 and attempt < self.rate_limit_retries:
+                delay = min(2 ** attempt, 30)
+                logging.warning("Превышен лимит запросов. Повтор через %s с...", delay)
+                await asyncio.sleep(delay)
+                continue
+            return data
+
+    async def _handle_api_error(self, response):
         """Обработка ошибок API"""
         if response.get("retCode") == 0:
             return response
@@ -265,10 +541,9 @@ class BybitAPI:
         error_msg = response.get("retMsg", "Неизвестная ошибка")
         error_code = response.get("retCode")
 
-        # Обработка rate limit
-        if error_code == 10006 and retry_count < self.rate_limit_retries:
-            logging.warning(f"Превышен лимит запросов. Ожидание {self.rate_limit_delay} секунд...")
-            await asyncio.sleep(self.rate_limit_delay)
+        # Rate limit: все повторы с экспоненциальной паузой уже исчерпаны в _get/_post
+        if error_code == 10006:
+            logging.warning("Превышен лимит запросов, повторы не помогли")
             return None
 
         # Обработка других ошибок
@@ -278,68 +553,83 @@ class BybitAPI:
         return None
 
     async def get_positions(self, category="linear", symbol=SYMBOL):
-        """Получение позиций с обработкой ошибок"""
-        await self._wait_for_rate_limit()
+        """Получение позиций с обработкой ошибок (кэш 2 с)"""
+        return await self._cached(
+            ("positions", category, symbol), 2.0,
+            lambda: self._fetch_positions(category, symbol)
+        )
+
+    async def _fetch_positions(self, category, symbol):
         try:
-            response = self.session.get_positions(category=category, symbol=symbol)
+            response = await self._get("/v5/position/list", {"category": category, "symbol": symbol}, signed=True)
             return await self._handle_api_error(response)
         except Exception as e:
-            logging.error(f"Ошибка при получении позиций: {e}")
+            logging.error("Ошибка при получении позиций: %s", e)
             return None
 
     async def get_kline(self, category="linear", symbol=SYMBOL, interval="5", limit=50):
         """Получение свечей с обработкой ошибок"""
-        await self._wait_for_rate_limit()
         try:
-            response = self.session.get_kline(category=category, symbol=symbol, interval=interval, limit=limit)
+            response = await self._get("/v5/market/kline", {"category": category, "symbol": symbol, "interval": interval, "limit": limit})
             return await self._handle_api_error(response)
         except Exception as e:
-            logging.error(f"Ошибка при получении свечей: {e}")
+            logging.error("Ошибка при получении свечей: %s", e)
             return None
 
     async def get_orderbook(self, category="linear", symbol=SYMBOL, limit=50):
         """Получение стакана с обработкой ошибок"""
-        await self._wait_for_rate_limit()
         try:
-            response = self.session.get_orderbook(category=category, symbol=symbol, limit=limit)
+            response = await self._get("/v5/market/orderbook", {"category": category, "symbol": symbol, "limit": limit})
             return await self._handle_api_error(response)
         except Exception as e:
-            logging.error(f"Ошибка при получении стакана: {e}")
+            logging.error("Ошибка при получении стакана: %s", e)
             return None
 
     async def get_executions(self, category="linear", symbol=SYMBOL, limit=50):
         """Получение исполненных ордеров с обработкой ошибок"""
-        await self._wait_for_rate_limit()
         try:
-            response = self.session.get_executions(category=category, symbol=symbol, limit=limit)
+            response = await self._get("/v5/execution/list", {"category": category, "symbol": symbol, "limit": limit}, signed=True)
             return await self._handle_api_error(response)
         except Exception as e:
-            logging.error(f"Ошибка при получении исполненных ордеров: {e}")
+            logging.error("Ошибка при получении исполненных ордеров: %s", e)
             return None
 
     async def get_wallet_balance(self, accountType="UNIFIED"):
-        """Получение баланса с обработкой ошибок"""
-        await self._wait_for_rate_limit()
+        """Получение баланса с обработкой ошибок (кэш 5 с)"""
+        return await self._cached(
+            ("wallet", accountType), 5.0,
+            lambda: self._fetch_wallet_balance(accountType)
+        )
+
+    async def _fetch_wallet_balance(self, accountType):
         try:
-            response = self.session.get_wallet_balance(accountType=accountType)
+            response = await self._get("/v5/account/wallet-balance", {"accountType": accountType}, signed=True)
             return await self._handle_api_error(response)
         except Exception as e:
-            logging.error(f"Ошибка при получении баланса: {e}")
+            logging.error("Ошибка при получении баланса: %s", e)
             return None
 
     async def set_leverage(self, symbol=SYMBOL, leverage=5):
         """Устанавливает плечо раздельно для лонга и шорта"""
         try:
-            await self._wait_for_rate_limit()
-            response = self.session.set_leverage(
-                category="linear",
-                symbol=symbol,
-                buyLeverage=str(leverage),
-                sellLeverage=str(leverage)
-            )
+            response = await self._post("/v5/position/set-leverage", {
+                "category": "linear",
+                "symbol": symbol,
+                "buyLeverage": str(leverage),
+                "sellLeverage": str(leverage)
+            })
+            return await self._handle_api_error(response)
+        except Exception as e:
+            logging.error("Ошибка при установке плеча: %s", e)
+            return None
+
+    async def create_order(self, **params):
+        """Размещает ордер с произвольными параметрами v5 /order/create"""
+        try:
+            response = await self._post("/v5/order/create", params)
             return await self._handle_api_error(response)
         except Exception as e:
-            logging.error(f"Ошибка при установке плеча: {e}")
+            logging.error("Ошибка при создании ордера: %s", e)
             return None
 
     async def place_order(self, side, qty, stop_loss=None, take_profit_1=None, take_profit_2=None, take_profit_3=None):
@@ -347,48 +637,53 @@ class BybitAPI:
         Размещает лимитный мейкер-ордер для USDT-M Perpetual Futures с поддержкой частичного закрытия
         """
         try:
+            # Сторону сравниваем один раз на ордер, а не в каждой ветке ниже
+            opp_side = "Sell" if side == "Buy" else "Buy"
+
             # Получаем текущую цену
             current_price = await self.get_latest_price()
             if not current_price:
                 return False
 
+            # Форматируем цену и объём один раз под тик-сайз пары
+            price_s = format(current_price, SYMBOL_PRICE_FMT)
+            qty_s = format(qty, SYMBOL_QTY_FMT)
+
             # Размещаем основной ордер
-            await self._wait_for_rate_limit()
             try:
-                order = self.session.place_order(
-                    category="linear",
-                    symbol=SYMBOL,
-                    side=side,
-                    orderType="Limit",
-                    qty=str(qty),
-                    price=str(current_price),
-                    timeInForce="PostOnly"  # Мейкерский ордер
-                )
+                order = await self._post("/v5/order/create", {
+                    "category": "linear",
+                    "symbol": SYMBOL,
+                    "side": side,
+                    "orderType": "Limit",
+                    "qty": qty_s,
+                    "price": price_s,
+                    "timeInForce": "PostOnly"  # Мейкерский ордер
+                })
             except Exception as e:
-                logging.error(f"Ошибка при размещении ордера: {e}")
+                logging.error("Ошибка при размещении ордера: %s", e)
                 return False
 
             if not order or "result" not in order:
-                logging.error(f"Ошибка размещения ордера: {order}")
+                logging.error("Ошибка размещения ордера: %s", order)
                 return False
 
             order_id = order["result"]["orderId"]
-            logging.info(f"Размещен ордер {order_id}")
+            logging.info("Размещен ордер %s", order_id)
 
             # Устанавливаем стоп-лосс и первый тейк-профит
             if stop_loss and take_profit_1:
-                await self._wait_for_rate_limit()
                 try:
-                    self.session.set_trading_stop(
-                        category="linear",
-                        symbol=SYMBOL,
-                        side=side,
-                        stopLoss=str(stop_loss),
-                        takeProfit=str(take_profit_1)
-                    )
-                    logging.info(f"Установлены SL: {stop_loss} и TP1: {take_profit_1}")
+                    await self._post("/v5/position/trading-stop", {
+                        "category": "linear",
+                        "symbol": SYMBOL,
+                        "side": side,
+                        "stopLoss": format(stop_loss, SYMBOL_PRICE_FMT),
+                        "takeProfit": format(take_profit_1, SYMBOL_PRICE_FMT)
+                    })
+                    logging.info("Установлены SL: %s и TP1: %s", stop_loss, take_profit_1)
                 except Exception as e:
-                    logging.error(f"Ошибка при установке SL/TP: {e}")
+                    logging.error("Ошибка при установке SL/TP: %s", e)
                     # Продолжаем выполнение, так как ордер уже размещен
 
             # Размещаем дополнительные тейк-профиты как лимитные ордера
@@ -398,41 +693,39 @@ class BybitAPI:
                 tp3_qty = qty * 0.4  # 40% позиции
 
                 # Проверяем минимальные размеры
-                if tp2_qty >= MIN_POSITION_SIZES.get(SYMBOL, 0.002):
-                    await self._wait_for_rate_limit()
+                if tp2_qty >= SYMBOL_MIN_POS:
                     try:
-                        tp2_order = self.session.place_order(
-                            category="linear",
-                            symbol=SYMBOL,
-                            side="Sell" if side == "Buy" else "Buy",
-                            orderType="Limit",
-                            qty=str(tp2_qty),
-                            price=str(take_profit_2),
-                            timeInForce="PostOnly",
-                            reduceOnly=True
-                        )
+                        tp2_order = await self._post("/v5/order/create", {
+                            "category": "linear",
+                            "symbol": SYMBOL,
+                            "side": opp_side,
+                            "orderType": "Limit",
+                            "qty": format(tp2_qty, SYMBOL_QTY_FMT),
+                            "price": format(take_profit_2, SYMBOL_PRICE_FMT),
+                            "timeInForce": "PostOnly",
+                            "reduceOnly": True
+                        })
                         if tp2_order and "result" in tp2_order:
-                            logging.info(f"Размещен TP2 ордер: {tp2_order['result']['orderId']}")
+                            logging.info("Размещен TP2 ордер: %s", tp2_order['result']['orderId'])
                     except Exception as e:
-                        logging.error(f"Ошибка при размещении TP2 ордера: {e}")
+                        logging.error("Ошибка при размещении TP2 ордера: %s", e)
 
-                if tp3_qty >= MIN_POSITION_SIZES.get(SYMBOL, 0.003):
-                    await self._wait_for_rate_limit()
+                if tp3_qty >= SYMBOL_MIN_POS:
                     try:
-                        tp3_order = self.session.place_order(
-                            category="linear",
-                            symbol=SYMBOL,
-                            side="Sell" if side == "Buy" else "Buy",
-                            orderType="Limit",
-                            qty=str(tp3_qty),
-                            price=str(take_profit_3),
-                            timeInForce="PostOnly",
-                            reduceOnly=True
-                        )
+                        tp3_order = await self._post("/v5/order/create", {
+                            "category": "linear",
+                            "symbol": SYMBOL,
+                            "side": opp_side,
+                            "orderType": "Limit",
+                            "qty": format(tp3_qty, SYMBOL_QTY_FMT),
+                            "price": format(take_profit_3, SYMBOL_PRICE_FMT),
+                            "timeInForce": "PostOnly",
+                            "reduceOnly": True
+                        })
                         if tp3_order and "result" in tp3_order:
-                            logging.info(f"Размещен TP3 ордер: {tp3_order['result']['orderId']}")
+                            logging.info("Размещен TP3 ордер: %s", tp3_order['result']['orderId'])
                     except Exception as e:
-                        logging.error(f"Ошибка при размещении TP3 ордера: {e}")
+                        logging.error("Ошибка при размещении TP3 ордера: %s", e)
 
             return True
         except Exception as e:
@@ -443,7 +736,6 @@ class BybitAPI:
 
     async def set_trading_stop(self, category="linear", symbol=SYMBOL, side="Buy", stopLoss=None, takeProfit=None):
         """Установка стоп-лосса и тейк-профита с обработкой ошибок"""
-        await self._wait_for_rate_limit()
         params = {
             "category": category,
             "symbol": symbol,
@@ -453,17 +745,16 @@ class BybitAPI:
             params["stopLoss"] = str(stopLoss)
         if takeProfit:
             params["takeProfit"] = str(takeProfit)
-        
+
         try:
-            response = self.session.set_trading_stop(**params)
+            response = await self._post("/v5/position/trading-stop", params)
             return await self._handle_api_error(response)
         except Exception as e:
-            logging.error(f"Ошибка при установке стоп-лосса: {e}")
+            logging.error("Ошибка при установке стоп-лосса: %s", e)
             return None
 
     async def get_closed_pnl(self, category="linear", symbol=SYMBOL, startTime=None, endTime=None, limit=50):
         """Получение закрытых PNL с обработкой ошибок"""
-        await self._wait_for_rate_limit()
         params = {
             "category": category,
             "symbol": symbol,
@@ -473,55 +764,59 @@ class BybitAPI:
             params["startTime"] = startTime
         if endTime:
             params["endTime"] = endTime
-        
-        try:    
-            response = self.session.get_closed_pnl(**params)
+
+        try:
+            response = await self._get("/v5/position/closed-pnl", params, signed=True)
             return await self._handle_api_error(response)
         except Exception as e:
-            logging.error(f"Ошибка при получении закрытых PNL: {e}")
+            logging.error("Ошибка при получении закрытых PNL: %s", e)
             return None
 
     async def get_order_list(self, category="linear", symbol=SYMBOL, orderId=None):
         """Получение информации о конкретном ордере"""
-        await self._wait_for_rate_limit()
         params = {
             "category": category,
             "symbol": symbol,
             "orderId": orderId
         }
         try:
-            response = self.session.get_open_orders(**params)
+            response = await self._get("/v5/order/realtime", params, signed=True)
             return await self._handle_api_error(response)
         except Exception as e:
-            logging.error(f"Ошибка при получении списка ордеров: {e}")
+            logging.error("Ошибка при получении списка ордеров: %s", e)
             return None
 
     async def get_tickers(self, category="linear", symbol=SYMBOL):
-        """Получение текущей цены тикера"""
-        await self._wait_for_rate_limit()
+        """Получение текущей цены тикера (кэш 1 с)"""
+        return await self._cached(
+            ("tickers", category, symbol), 1.0,
+            lambda: self._fetch_tickers(category, symbol)
+        )
+
+    async def _fetch_tickers(self, category, symbol):
         try:
-            response = self.session.get_tickers(category=category, symbol=symbol)
+            response = await self._get("/v5/market/tickers", {"category": category, "symbol": symbol})
             return await self._handle_api_error(response)
         except Exception as e:
-            logging.error(f"Ошибка при получении тикеров: {e}")
+            logging.error("Ошибка при получении тикеров: %s", e)
             return None
 
     async def get_latest_price(self):
         """Получает последнюю цену"""
         try:
-            tickers = await self.api.get_tickers(category="linear", symbol=SYMBOL)
+            tickers = await self.get_tickers(category="linear", symbol=SYMBOL)
             if tickers and "result" in tickers and "list" in tickers["result"]:
                 price = float(tickers["result"]["list"][0]["lastPrice"])
                 # Сохраняем цену в price.json
                 price_data = {"price": price, "last_updated": datetime.now().isoformat()}
                 if update_json_file("price.json", price_data):
-                    logging.info(f"✅ Цена успешно обновлена: {price}")
+                    logging.info("✅ Цена успешно обновлена: %s", price)
                 else:
                     logging.error("❌ Ошибка при сохранении цены в JSON")
                 return price
             return None
         except Exception as e:
-            logging.error(f"Ошибка при получении цены: {e}")
+            logging.error("Ошибка при получении цены: %s", e)
             return None
 
 # ======================== Класс торгового бота ========================
@@ -546,19 +841,30 @@ class TradingBot:
             self.min_order_interval = 300
             self.last_checked_price = None
             self.consecutive_losses = 0
-            self.processed_orders = set()
-            self.last_daily_reset = datetime.now().date()
+            # FIFO с ограничением: вставка O(1), вытесняется самый старый ордер
+            self.processed_orders = OrderedDict()
+            # Очередь уведомлений: всплеск сообщений склеивается в одно
+            self.tg_queue = asyncio.Queue()
+            self.tg_worker_task = None
+            # Сериализуем только размещение ордера и мутацию позиции;
+            # все читающие пути (индикаторы, уровни, цена) идут без блокировки
+            self.order_lock = asyncio.Lock()
+            # Кэш индикаторов: ключ — время последней свечи, внутри одного
+            # бара повторные тики получают готовые значения без talib
+            self._indicator_cache = {}
+            # Кэш исторических закрытий по таймфреймам: timeframe -> (ts, ndarray)
+            self._hist_cache = {}
+            # Разобранный индекс монет кошелька: (ts, {coin: item})
+            self._balance_cache = None
+            # Снимок стакана в SoA-раскладке: (ts, bid_sizes, ask_sizes)
+            self._ob_cache = None
+            # Разобранные закрытия свечей: interval -> (ts последней свечи, ndarray)
+            self._closes_cache = {}
+            self.last_daily_reset = (int(time.time()) + LOCAL_TZ_OFFSET) // 86400
             self.daily_pnl = 0
             
-            # Инициализация сессии Bybit API
-            self.session = HTTP(
-                testnet=TESTNET,
-                api_key=os.getenv("BYBIT_API_KEY"),
-                api_secret=os.getenv("BYBIT_API_SECRET")
-            )
-            
             # Создаем API клиент с контролем частоты запросов
-            self.api = BybitAPI(self.session)
+            self.api = BybitAPI()
             
             self.last_positions_update = 0
             self.last_pnl_update = 0
@@ -570,9 +876,9 @@ class TradingBot:
             self.pnl_data = {"daily_pnl": 0, "trades": []}
             self.signals = {"refresh_data": False, "last_signal": None, "last_updated": None}
             
-            logging.info(f"✅ Бот успешно инициализирован. leverage_set = {self.leverage_set}")
+            logging.info("✅ Бот успешно инициализирован. leverage_set = %s", self.leverage_set)
         except Exception as e:
-            logging.error(f"❌ Ошибка при инициализации бота: {e}")
+            logging.error("❌ Ошибка при инициализации бота: %s", e)
             raise
 
     async def initialize_leverage(self):
@@ -600,7 +906,7 @@ class TradingBot:
                     # Если плечо уже установлено правильно, не меняем его
                     if current_leverage == LEVERAGE:
                         self.leverage_set = True
-                        logging.info(f"✅ Плечо уже установлено: {LEVERAGE}x")
+                        logging.info("✅ Плечо уже установлено: %sx", LEVERAGE)
                         return True
             
             # Если плечо не установлено или отличается от требуемого, устанавливаем новое
@@ -609,27 +915,43 @@ class TradingBot:
                 result = await self.api.set_leverage(symbol=SYMBOL, leverage=LEVERAGE)
                 if result and result.get("retCode") == 0:
                     self.leverage_set = True
-                    logging.info(f"✅ Плечо успешно установлено: {LEVERAGE}x")
+                    logging.info("✅ Плечо успешно установлено: %sx", LEVERAGE)
                     return True
                 elif result and result.get("retCode") == 110043:
                     # Ошибка 'leverage not modified' - плечо уже установлено
                     self.leverage_set = True
-                    logging.info(f"✅ Плечо уже установлено ранее: {LEVERAGE}x")
+                    logging.info("✅ Плечо уже установлено ранее: %sx", LEVERAGE)
                     return True
                 retries -= 1
                 await asyncio.sleep(1)
             
             error_msg = "❌ Не удалось установить плечо после нескольких попыток"
             logging.error(error_msg)
+            # Отправляем напрямую: это стартовый путь, воркер очереди ещё не запущен
             await send_telegram_message(error_msg)
             return False
-            
+
         except Exception as e:
             error_msg = f"❌ Ошибка при установке плеча: {e}"
             logging.error(error_msg)
             await send_telegram_message(error_msg)
             return False
 
+    async def start(self):
+        """
+        Параллельный старт: установка плеча и прогрев кошелька (и TLS-соединения)
+        идут одновременно, а не друг за другом
+        """
+        try:
+            leverage_ok, _ = await asyncio.gather(
+                self.initialize_leverage(),
+                self.api.get_wallet_balance()
+            )
+            return leverage_ok
+        except Exception as e:
+            logging.error("❌ Ошибка при старте бота: %s", e)
+            return False
+
     async def process_signal(self, signal_data):
         """Обрабатывает входной сигнал из signals.json"""
         try:
@@ -645,27 +967,29 @@ class TradingBot:
                 logging.error("❌ Ошибка: некорректные данные сигнала")
                 return
 
-            # Размещаем ордер
-            if await self.api.place_order(side, qty, stop_loss, take_profit_1, take_profit_2, take_profit_3):
-                logging.info(f"✅ Успешно открыт ордер {side} {qty} @ {price}")
-                self.active_position = True
-                self.current_position = {
-                    "side": side,
-                    "entry_price": price,
-                    "stop_loss": stop_loss,
-                    "take_profit_1": take_profit_1,
-                    "take_profit_2": take_profit_2,
-                    "take_profit_3": take_profit_3,
-                    "size": qty
-                }
+            # Размещаем ордер; критическая секция закрывает гонку
+            # с параллельной проверкой PnL/позиций
+            async with self.order_lock:
+                if await self.api.place_order(side, qty, stop_loss, take_profit_1, take_profit_2, take_profit_3):
+                    logging.info("✅ Успешно открыт ордер %s %s @ %s", side, qty, price)
+                    self.active_position = True
+                    self.current_position = {
+                        "side": side,
+                        "entry_price": price,
+                        "stop_loss": stop_loss,
+                        "take_profit_1": take_profit_1,
+                        "take_profit_2": take_profit_2,
+                        "take_profit_3": take_profit_3,
+                        "size": qty
+                    }
 
-                await send_telegram_message(f"✅ Открыта позиция: {side} {qty} @ {price:.2f}")
+                    self.tg_queue.put_nowait(f"✅ Открыта позиция: {side} {qty} @ {price:.2f}")
 
-                # Очистка сигнала
-                signal_data["force_trade"] = False
-                update_json_file("signals.json", signal_data)
+                    # Очистка сигнала
+                    signal_data["force_trade"] = False
+                    update_json_file("signals.json", signal_data)
         except Exception as e:
-            logging.error(f"❌ Ошибка при обработке сигнала: {e}")
+            logging.error("❌ Ошибка при обработке сигнала: %s", e)
 
     async def run(self):
         """Запуск бота"""
@@ -688,6 +1012,9 @@ class TradingBot:
             # Запуск мониторинга позиций
             self.position_watcher_task = asyncio.create_task(self.position_monitor())
 
+            # Запуск фонового отправщика уведомлений
+            self.tg_worker_task = asyncio.create_task(self._tg_worker())
+
             # Отправка приветственного сообщения
             await send_telegram_message(
                 f"🤖 Торговый бот запущен\n"
@@ -723,34 +1050,54 @@ class TradingBot:
             logging.info("Задача бота отменена")
             bot_running = False
         except Exception as e:
-            logging.error(f"Ошибка в основном цикле бота: {e}")
+            logging.error("Ошибка в основном цикле бота: %s", e)
             await send_telegram_message(f"⚠️ Ошибка в работе бота: {e}")
             bot_running = False
             raise  # Пробрасываем ошибку дальше для отладки
         finally:
             if hasattr(self, 'position_watcher_task') and self.position_watcher_task:
                 self.position_watcher_task.cancel()
-            
+            if self.tg_worker_task:
+                self.tg_worker_task.cancel()
+
             logging.info("Бот остановлен")
             await send_telegram_message("🛑 Бот остановлен")
             return True
 
+    async def _tg_worker(self):
+        """
+        Фоновый отправщик Telegram-уведомлений: копит всплеск сообщений
+        и шлёт их одним запросом, не превышая лимит Telegram
+        """
+        try:
+            while True:
+                messages = [await self.tg_queue.get()]
+                # Короткая пауза, чтобы одновременные события успели попасть в очередь
+                await asyncio.sleep(0.05)
+                while not self.tg_queue.empty():
+                    messages.append(self.tg_queue.get_nowait())
+                await send_telegram_message("\n---\n".join(messages))
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logging.error("Ошибка в отправщике уведомлений: %s", e)
+
     async def update_trading_data(self):
         """
         Обновляет данные о балансе, позициях и PnL
         """
         try:
-            current_time = time.time()
+            current_time = time.monotonic()  # интервалы считаем по монотонным часам
             
             # Обновляем баланс каждые 5 минут
             if current_time - self.last_positions_update >= 300:
                 logging.info("🔄 Начинаем обновление баланса...")
                 balance_info = await self.api.get_wallet_balance(accountType="UNIFIED")
-                logging.info(f"📊 Ответ API get_wallet_balance: {balance_info}")
+                logging.info("📊 Ответ API get_wallet_balance: %s", balance_info)
 
                 if balance_info and "result" in balance_info and "list" in balance_info["result"]:
                     wallet = balance_info["result"]["list"][0]
-                    logging.info(f"📊 Данные кошелька: {wallet}")
+                    logging.info("📊 Данные кошелька: %s", wallet)
                     
                     # Собираем все балансы
                     all_balances = {}
@@ -766,9 +1113,9 @@ class TradingBot:
                                     "equity": equity,
                                     "unrealized_pnl": unrealized_pnl
                                 }
-                                logging.info(f"📊 Баланс {coin_name}: {balance}, Equity: {equity}, Unrealized PnL: {unrealized_pnl}")
+                                logging.info("📊 Баланс %s: %s, Equity: %s, Unrealized PnL: %s", coin_name, balance, equity, unrealized_pnl)
                         except (ValueError, TypeError) as e:
-                            logging.error(f"❌ Ошибка при обработке баланса {coin_name}: {e}")
+                            logging.error("❌ Ошибка при обработке баланса %s: %s", coin_name, e)
                             continue
 
                     # Суммируем все USD и USDT балансы
@@ -776,9 +1123,9 @@ class TradingBot:
                     total_equity = sum(b["equity"] for b in all_balances.values())
                     total_unrealized_pnl = sum(b["unrealized_pnl"] for b in all_balances.values())
                     
-                    logging.info(f"📊 Общий баланс: {total_balance:.2f}")
-                    logging.info(f"📊 Общий equity: {total_equity:.2f}")
-                    logging.info(f"📊 Общий unrealized PnL: {total_unrealized_pnl:.2f}")
+                    logging.info("📊 Общий баланс: %.2f", total_balance)
+                    logging.info("📊 Общий equity: %.2f", total_equity)
+                    logging.info("📊 Общий unrealized PnL: %.2f", total_unrealized_pnl)
                     
                     if total_balance > 0:
                         try:
@@ -796,11 +1143,11 @@ class TradingBot:
                             }
                             
                             if update_json_file("balance.json", balance_data):
-                                logging.info(f"✅ balance.json обновлен: {balance_data}")
+                                logging.info("✅ balance.json обновлен: %s", balance_data)
                             else:
                                 logging.error("❌ Ошибка при записи balance.json")
                         except (ValueError, TypeError) as e:
-                            logging.error(f"❌ Ошибка при преобразовании данных баланса: {e}")
+                            logging.error("❌ Ошибка при преобразовании данных баланса: %s", e)
                     else:
                         logging.warning("⚠️ API вернул нулевой баланс, обновление отменено")
                 else:
@@ -813,7 +1160,7 @@ class TradingBot:
                 if positions and positions.get("result", {}).get("list"):
                     self.positions = positions["result"]["list"][0]
                     self.last_positions_update = current_time
-                    logging.info(f"📊 Получены позиции: {self.positions}")
+                    logging.info("📊 Получены позиции: %s", self.positions)
                     
                     # Сохраняем в JSON
                     if update_json_file("positions.json", {"positions": self.positions}):
@@ -829,7 +1176,7 @@ class TradingBot:
                     self.pnl_data["trades"] = pnl["result"]["list"]
                     self.pnl_data["daily_pnl"] = sum(float(trade["closedPnl"]) for trade in pnl["result"]["list"])
                     self.last_pnl_update = current_time
-                    logging.info(f"📊 Обновлен PnL: {self.pnl_data}")
+                    logging.info("📊 Обновлен PnL: %s", self.pnl_data)
                     
                     # Сохраняем в JSON
                     if update_json_file("pnl.json", self.pnl_data):
@@ -843,7 +1190,7 @@ class TradingBot:
             if price:
                 price_data = {"price": price, "last_updated": datetime.now().isoformat()}
                 if update_json_file("price.json", price_data):
-                    logging.info(f"✅ price.json обновлен: {price}")
+                    logging.info("✅ price.json обновлен: %s", price)
                 else:
                     logging.error("❌ Ошибка при сохранении price.json")
             
@@ -858,10 +1205,10 @@ class TradingBot:
                     logging.error("❌ Ошибка при обновлении signals.json")
                     
         except Exception as e:
-            logging.error(f"❌ Ошибка при обновлении данных: {str(e)}")
-            logging.error(f"❌ Тип ошибки: {type(e).__name__}")
+            logging.error("❌ Ошибка при обновлении данных: %s", str(e))
+            logging.error("❌ Тип ошибки: %s", type(e).__name__)
             import traceback
-            logging.error(f"❌ Трейсбек: {traceback.format_exc()}")
+            logging.error("❌ Трейсбек: %s", traceback.format_exc())
 
     async def get_atr(self, period=14):
         """Рассчитывает ATR (Average True Range)"""
@@ -872,27 +1219,40 @@ class TradingBot:
                 logging.error("Некорректный формат данных свечей")
                 return None
 
-            highs = np.array([float(candle[2]) for candle in candles["result"]["list"]])
-            lows = np.array([float(candle[3]) for candle in candles["result"]["list"]])
-            closes = np.array([float(candle[4]) for candle in candles["result"]["list"]])
+            # Один проход по свечам вместо трёх list comprehension:
+            # парсим строки в числа единым потоком и режем на столбцы (SoA)
+            rows = candles["result"]["list"]
+            arr = np.fromiter(
+                (float(x) for row in rows for x in row[:5]),
+                dtype=np.float64
+            ).reshape(-1, 5)
+            highs = np.ascontiguousarray(arr[:, 2])
+            lows = np.ascontiguousarray(arr[:, 3])
+            closes = np.ascontiguousarray(arr[:, 4])
 
             if len(closes) < period:
-                logging.error(f"Недостаточно данных для ATR. Получено {len(closes)} свечей, требуется {period}")
+                logging.error("Недостаточно данных для ATR. Получено %s свечей, требуется %s", len(closes), period)
                 return None
 
-            atr = talib.ATR(highs, lows, closes, timeperiod=period)[-1]
+            # Нужно только последнее значение: скалярное ядро не аллоцирует
+            # массив под весь ряд, как это делает talib.ATR
+            if HAS_NUMBA and len(closes) > period:
+                atr = atr_last(highs, lows, closes, period)
+            else:
+                atr = ta_stream.ATR(highs, lows, closes, timeperiod=period)
             return atr
         except Exception as e:
-            logging.error(f"Ошибка при расчёте ATR: {e}")
+            logging.error("Ошибка при расчёте ATR: %s", e)
             return None
 
     async def reset_daily_stats(self):
-        today = datetime.now().date()
-        if self.last_daily_reset != today:
+        # Целочисленный номер дня дешевле, чем datetime.now().date() на каждом тике
+        today_idx = (int(time.time()) + LOCAL_TZ_OFFSET) // 86400
+        if self.last_daily_reset != today_idx:
             self.daily_pnl = 0
             self.daily_trade_count = 0
-            self.last_daily_reset = today
-            await send_telegram_message("📊 Дневная статистика сброшена.")
+            self.last_daily_reset = today_idx
+            self.tg_queue.put_nowait("📊 Дневная статистика сброшена.")
 
     async def check_pnl(self):
         """
@@ -926,20 +1286,24 @@ class TradingBot:
                 logging.info("📉 Нет закрытых сделок, PnL пока нулевой.")
                 return True
 
-            # Обрабатываем каждый закрытый ордер
-            for order in trades:
-                order_id = order.get("orderId")
-                if not order_id or order_id in self.processed_orders:
-                    continue
+            # Отбираем необработанные ордера и тянем их детали параллельно:
+            # N последовательных запросов превращаются в один раунд gather
+            unprocessed = [
+                order for order in trades
+                if order.get("orderId") and order.get("orderId") not in self.processed_orders
+            ]
+            details = await asyncio.gather(
+                *(self.api.get_order_list(category="linear", symbol=SYMBOL, orderId=order["orderId"])
+                  for order in unprocessed),
+                return_exceptions=True
+            )
 
-                order_details = await self.api.get_order_list(
-                    category="linear",
-                    symbol=SYMBOL,
-                    orderId=order_id
-                )
+            for order, order_details in zip(unprocessed, details):
+                order_id = order["orderId"]
 
-                if not order_details or "result" not in order_details or "list" not in order_details["result"]:
-                    logging.info(f"⚠️ Нет деталей для ордера {order_id}")
+                if (isinstance(order_details, Exception) or not order_details
+                        or "result" not in order_details or "list" not in order_details["result"]):
+                    logging.info("⚠️ Нет деталей для ордера %s", order_id)
                     continue
 
                 order_info = order_details["result"]["list"][0]
@@ -967,25 +1331,25 @@ class TradingBot:
                     PNL: {pnl:.2f} USDT
                     📊 Дневной PNL: {self.daily_pnl:.2f} USDT
                     """
-                    await send_telegram_message(message)
+                    self.tg_queue.put_nowait(message)
 
                     # Проверяем лимиты
                     if self.daily_pnl <= -100:  # Максимальный дневной убыток 100 USDT
                         error_msg = "⚠️ Достигнут лимит дневного убытка. Торговля остановлена."
                         logging.warning(error_msg)
-                        await send_telegram_message(error_msg)
+                        self.tg_queue.put_nowait(error_msg)
                         return False
 
                     if self.consecutive_losses >= 3:  # Максимум 3 последовательных убытка
                         error_msg = "⚠️ Достигнут лимит последовательных убытков. Торговля остановлена."
                         logging.warning(error_msg)
-                        await send_telegram_message(error_msg)
+                        self.tg_queue.put_nowait(error_msg)
                         return False
 
-                    # Добавляем ордер в обработанные
-                    self.processed_orders.add(order_id)
-                    if len(self.processed_orders) > 50:  # Ограничиваем размер множества
-                        self.processed_orders = set(list(self.processed_orders)[-50:])
+                    # Добавляем ордер в обработанные, вытесняя самый старый при переполнении
+                    self.processed_orders[order_id] = None
+                    if len(self.processed_orders) > 256:
+                        self.processed_orders.popitem(last=False)
 
             # Обновляем время последней проверки
             self.last_trade_time = current_time
@@ -994,7 +1358,7 @@ class TradingBot:
         except Exception as e:
             error_msg = f"Ошибка при проверке PNL: {e}"
             logging.error(error_msg)
-            await send_telegram_message(f"⚠️ {error_msg}")
+            self.tg_queue.put_nowait(f"⚠️ {error_msg}")
             return False
 
     async def scalping_strategy(self):
@@ -1008,13 +1372,13 @@ class TradingBot:
                 return
 
             # Проверяем, не слишком ли рано для нового ордера
-            current_time = time.time()
+            current_time = time.monotonic()  # интервалы считаем по монотонным часам
             if current_time - self.last_order_time < self.min_order_interval:
                 logging.info("Ждём следующего интервала для входа.")
                 return
 
             # Получаем текущую цену
-            price = await self.get_latest_price()
+            price = await self.api.get_latest_price()
             if price is None:
                 return
 
@@ -1030,13 +1394,13 @@ class TradingBot:
                 logging.info("Уже есть активная позиция, пропускаем вход")
                 return
 
-            # Проверяем волатильность рынка
+            # Проверяем волатильность рынка и подбираем интервал по таблице режимов
             atr = await self.get_atr()
             if atr:
-                # Если волатильность слишком высокая, увеличиваем интервал между ордерами
-                if atr > price * 0.01:  # Если ATR > 1% от цены
-                    self.min_order_interval = 600  # Увеличиваем до 10 минут
-                    logging.info(f"Высокая волатильность (ATR: {atr:.2f}), увеличиваем интервал между ордерами")
+                vol_ratio = atr / price  # делим один раз, дальше только сравнение
+                self.min_order_interval = int(_VOL_INTERVALS[np.searchsorted(_VOL_THRESHOLDS, vol_ratio)])
+                if vol_ratio > 0.01:
+                    logging.info("Высокая волатильность (ATR: %.2f), увеличиваем интервал между ордерами", atr)
             else:
                 self.min_order_interval = 300  # Возвращаем к 5 минутам
 
@@ -1052,8 +1416,9 @@ class TradingBot:
                 logging.warning("Не удалось получить долгосрочные уровни")
                 return
 
-            # Проверяем тренд и условия входа
-            trend_confirmed = await self.check_trend(volume_direction)
+            # Проверяем тренд и условия входа; сигнал по объемам уже
+            # посчитан выше — передаем его, чтобы не пересчитывать
+            trend_confirmed = await self.check_trend(volume_direction, volume_signal=volume_direction)
             if trend_confirmed:
                 # Проверяем долгосрочные уровни
                 if price < long_term_levels["4H"]["support"]:
@@ -1069,37 +1434,25 @@ class TradingBot:
                 if not await self.check_stop_loss_distance(price, stop_loss):
                     return
 
-                # Рассчитываем тейк-профиты
-                if volume_direction == "Buy":
-                    take_profit_1 = price * (1 + TAKE_PROFIT_1 / 100)
-                    take_profit_2 = price * (1 + TAKE_PROFIT_2 / 100)
-                    take_profit_3 = price * (1 + TAKE_PROFIT_3 / 100)
-                else:
-                    take_profit_1 = price * (1 - TAKE_PROFIT_1 / 100)
-                    take_profit_2 = price * (1 - TAKE_PROFIT_2 / 100)
-                    take_profit_3 = price * (1 - TAKE_PROFIT_3 / 100)
+                # Рассчитываем тейк-профиты по готовым множителям
+                tp_mults = _TP_BUY if volume_direction == "Buy" else _TP_SELL
+                take_profit_1, take_profit_2, take_profit_3 = (price * m for m in tp_mults)
 
                 # Проверяем достаточность маржи
-                try:
-                    account_info = await self.api.get_wallet_balance(accountType="UNIFIED")
-                    if account_info and "result" in account_info and "list" in account_info["result"]:
-                        balance_info = account_info["result"]["list"][0]
-                        if "coin" in balance_info:
-                            for item in balance_info["coin"]:
-                                if item["coin"].upper() == "USDT":
-                                    available_balance = float(item["walletBalance"])
-                                    # Рассчитываем размер позиции с учетом плеча
-                                    qty = await self.calculate_position_size(stop_loss, price)
-                                    if qty is None:
-                                        return
-                                        
-                                    required_margin = (price * qty) / LEVERAGE
-                                    if available_balance < required_margin:
-                                        logging.warning(f"Недостаточно маржи: доступно {available_balance:.2f} USDT, требуется {required_margin:.2f} USDT")
-                                        return
-                                    break
-                except Exception as e:
-                    logging.error(f"Ошибка при проверке маржи: {e}")
+                available_balance = await self._get_usdt_balance()
+                if available_balance is None:
+                    return
+
+                # Рассчитываем размер позиции с учетом плеча;
+                # баланс уже получен выше — передаём его, чтобы расчёт
+                # не ходил за кошельком второй раз
+                qty = await self.calculate_trade_size(stop_loss, price, available_balance)
+                if qty is None:
+                    return
+
+                required_margin = (price * qty) / LEVERAGE
+                if available_balance < required_margin:
+                    logging.warning("Недостаточно маржи: доступно %.2f USDT, требуется %.2f USDT", available_balance, required_margin)
                     return
 
                 # Проверяем ликвидность
@@ -1107,35 +1460,40 @@ class TradingBot:
                     logging.info("Недостаточная ликвидность для входа")
                     return
 
-                logging.info(f"Планируем {volume_direction} ордер: qty={qty}, entry={price}, SL={stop_loss}")
-                logging.info(f"Цели: TP1={take_profit_1}, TP2={take_profit_2}, TP3={take_profit_3}")
-
-                # Размещаем ордер
-                if await self.place_order(volume_direction, qty, stop_loss, take_profit_1, take_profit_2, take_profit_3):
-                    self.active_position = True
-                    self.last_order_time = current_time
-                    self.daily_trade_count += 1  # Увеличиваем счетчик сделок
-                    self.current_position = {
-                        "side": volume_direction,
-                        "entry_price": price,
-                        "stop_loss": stop_loss,
-                        "take_profit_1": take_profit_1,
-                        "take_profit_2": take_profit_2,
-                        "take_profit_3": take_profit_3,
-                        "size": qty
-                    }
-                    await send_telegram_message(f"""
-                    🎯 Открыта позиция:
-                    Сторона: {volume_direction}
-                    Размер: {qty} {SYMBOL}
-                    Вход: {price:.2f}
-                    SL: {stop_loss:.2f}
-                    TP1: {take_profit_1:.2f}
-                    TP2: {take_profit_2:.2f}
-                    TP3: {take_profit_3:.2f}
-                    📊 ATR: {atr:.2f if atr else 'N/A'}
-                    📈 Сделка {self.daily_trade_count} из {self.max_daily_trades}
-                    """)
+                logging.info("Планируем %s ордер: qty=%s, entry=%s, SL=%s", volume_direction, qty, price, stop_loss)
+                logging.info("Цели: TP1=%s, TP2=%s, TP3=%s", take_profit_1, take_profit_2, take_profit_3)
+
+                # Размещаем ордер под той же блокировкой, что и process_signal,
+                # чтобы два пути входа не открыли позицию одновременно
+                async with self.order_lock:
+                    if self.active_position:
+                        logging.info("Позиция уже открыта конкурентным путём, пропускаем вход")
+                        return
+                    if await self.api.place_order(volume_direction, qty, stop_loss, take_profit_1, take_profit_2, take_profit_3):
+                        self.active_position = True
+                        self.last_order_time = current_time
+                        self.daily_trade_count += 1  # Увеличиваем счетчик сделок
+                        self.current_position = {
+                            "side": volume_direction,
+                            "entry_price": price,
+                            "stop_loss": stop_loss,
+                            "take_profit_1": take_profit_1,
+                            "take_profit_2": take_profit_2,
+                            "take_profit_3": take_profit_3,
+                            "size": qty
+                        }
+                        self.tg_queue.put_nowait(f"""
+                        🎯 Открыта позиция:
+                        Сторона: {volume_direction}
+                        Размер: {qty} {SYMBOL}
+                        Вход: {price:.2f}
+                        SL: {stop_loss:.2f}
+                        TP1: {take_profit_1:.2f}
+                        TP2: {take_profit_2:.2f}
+                        TP3: {take_profit_3:.2f}
+                        📊 ATR: {atr:.2f if atr else 'N/A'}
+                        📈 Сделка {self.daily_trade_count} из {self.max_daily_trades}
+                        """)
             else:
                 logging.info("Нет подтверждения тренда для входа")
 
@@ -1144,39 +1502,37 @@ class TradingBot:
         except Exception as e:
             error_msg = f"Ошибка в scalping_strategy: {e}"
             logging.error(error_msg)
-            await send_telegram_message(f"⚠ {error_msg}")
+            self.tg_queue.put_nowait(f"⚠ {error_msg}")
 
     async def update_trailing_stop(self, position, current_price):
         """
-        Обновляет трейлинг-стоп для открытой позиции с учетом минимального шага
+        Обновляет трейлинг-стоп для открытой позиции с учетом минимального шага.
+        Арифметика вынесена в ядро _trail_compute — на тике остаётся только
+        разбор позиции и условный вызов API.
         """
         try:
             side = position["side"]
-            current_stop = position["stop_loss"]
-
-            if side == "Buy":
-                new_stop = current_price * (1 - TRAILING_STOP / 100)
-                if new_stop <= current_stop or ((new_stop - current_stop) / current_stop * 100) < 0.1:
-                    return False
-                await self.api.set_trading_stop(category="linear", symbol=SYMBOL, side="Buy", stopLoss=str(new_stop))
-                position["stop_loss"] = new_stop
-                return True
+            is_buy = side == "Buy"
+            new_stop, should_update = _trail_compute(
+                is_buy, current_price, position["stop_loss"],
+                _TRAIL_BUY if is_buy else _TRAIL_SELL
+            )
+            if not should_update:
+                return False
 
-            else:
-                new_stop = current_price * (1 + TRAILING_STOP / 100)
-                if new_stop >= current_stop or ((current_stop - new_stop) / current_stop * 100) < 0.1:
-                    return False
-                await self.api.set_trading_stop(category="linear", symbol=SYMBOL, side="Sell", stopLoss=str(new_stop))
-                position["stop_loss"] = new_stop
-                return True
+            await self.api.set_trading_stop(category="linear", symbol=SYMBOL, side=side, stopLoss=str(new_stop))
+            position["stop_loss"] = new_stop
+            return True
 
         except Exception as e:
-            logging.error(f"Ошибка при обновлении трейлинг-стопа: {e}")
+            logging.error("Ошибка при обновлении трейлинг-стопа: %s", e)
             return False
 
-    async def check_trend(self, side):
+    async def check_trend(self, side, volume_signal=None):
         """
-        Улучшенная проверка тренда с использованием нескольких индикаторов
+        Улучшенная проверка тренда с использованием нескольких индикаторов.
+        Если вызывающий уже посчитал сигнал по объёмам, передаём его сюда
+        и не гоняем analyze_volume (HTTP + разбор сделок) второй раз.
         """
         try:
             # Получаем свечи
@@ -1186,14 +1542,31 @@ class TradingBot:
                 return False
 
             # Получаем цены закрытия - Bybit API возвращает свечи в формате списка, где индекс 4 - это цена закрытия
-            closes = [float(candle[4]) for candle in candles["result"]["list"]]
+            rows = candles["result"]["list"]
+            # Пока не открылась новая свеча, массив закрытий не меняется —
+            # держим один буфер на интервал и не парсим строки заново
+            latest_ts = rows[0][0] if rows else None
+            cached_closes = self._closes_cache.get("5")
+            if cached_closes is not None and cached_closes[0] == latest_ts:
+                closes = cached_closes[1]
+            else:
+                # fromiter с count заполняет ndarray сразу, без промежуточного списка
+                closes = np.fromiter((float(row[4]) for row in rows), dtype=np.float64, count=len(rows))
+                self._closes_cache["5"] = (latest_ts, closes)
             if len(closes) < 50:
                 logging.warning("Недостаточно данных для анализа")
                 return False
 
-            # Рассчитываем индикаторы
-            sma50 = talib.SMA(np.array(closes), timeperiod=50)[-1]
-            rsi = talib.RSI(np.array(closes), timeperiod=RSI_PERIOD)[-1]
+            # Рассчитываем индикаторы: пока не открылась новая свеча,
+            # talib не перезапускаем — значения берём из кэша
+            cache_key = (SYMBOL, "5", rows[0][0])
+            cached = self._indicator_cache.get("trend")
+            if cached is not None and cached[0] == cache_key:
+                sma50, rsi = cached[1]
+            else:
+                sma50 = ta_stream.SMA(closes, timeperiod=50)
+                rsi = ta_stream.RSI(closes, timeperiod=RSI_PERIOD)
+                self._indicator_cache["trend"] = (cache_key, (sma50, rsi))
             vwap = await self.calculate_vwap()
 
             if not vwap:
@@ -1203,7 +1576,8 @@ class TradingBot:
             
             # Получаем сигналы один раз и сохраняем их
             orderbook_signal = await self.analyze_orderbook(side)
-            volume_signal = await self.analyze_volume()
+            if volume_signal is None:
+                volume_signal = await self.analyze_volume()
 
             # Проверяем условия для входа
             if side == "Buy":
@@ -1227,23 +1601,50 @@ class TradingBot:
                 )
                 return sell_condition
         except Exception as e:
-            logging.error(f"Ошибка в check_trend: {e}")
+            logging.error("Ошибка в check_trend: %s", e)
             return False
 
-    async def check_liquidity(self, side):
+    async def _get_orderbook_sizes(self):
         """
-        Проверяет ликвидность в стакане для заданной стороны
+        Возвращает объёмы стакана двумя массивами (bid_sizes, ask_sizes).
+
+        Ответ API разбирается один раз и живёт ~1 секунду: потребителям
+        остаются только векторные редукции, без повторного прохода
+        по уровням [цена, объём].
         """
         try:
-            # Получаем стакан
-            orderbook = await self.api.get_orderbook(category="linear", symbol=SYMBOL)
+            now = time.monotonic()
+            if self._ob_cache is not None and now - self._ob_cache[0] < 1.0:
+                return self._ob_cache[1], self._ob_cache[2]
+
+            orderbook = await self.api.get_orderbook(category="linear", symbol=SYMBOL, limit=ORDERBOOK_DEPTH)
             if not orderbook or "result" not in orderbook:
                 logging.error("Неверный формат данных стакана")
+                return None, None
+
+            bids = orderbook["result"]["b"]
+            asks = orderbook["result"]["a"]
+            bid_sizes = np.fromiter((float(row[1]) for row in bids), dtype=np.float64, count=len(bids))
+            ask_sizes = np.fromiter((float(row[1]) for row in asks), dtype=np.float64, count=len(asks))
+            self._ob_cache = (now, bid_sizes, ask_sizes)
+            return bid_sizes, ask_sizes
+        except Exception as e:
+            logging.error("Ошибка при получении стакана: %s", e)
+            return None, None
+
+    async def check_liquidity(self, side):
+        """
+        Проверяет ликвидность в стакане для заданной стороны
+        """
+        try:
+            # Получаем разобранный снимок стакана
+            bid_sizes, ask_sizes = await self._get_orderbook_sizes()
+            if bid_sizes is None:
                 return False
 
             # Суммируем объемы в первых 5 уровнях
-            bids = sum([float(order["size"]) for order in orderbook["result"]["b"][:5]])
-            asks = sum([float(order["size"]) for order in orderbook["result"]["a"][:5]])
+            bids = bid_sizes[:5].sum()
+            asks = ask_sizes[:5].sum()
 
             # Проверяем соотношение объемов
             if side == "Buy":
@@ -1253,33 +1654,47 @@ class TradingBot:
                 # Для продажи: объемы на продажу должны быть в 2 раза больше
                 return asks > bids * MIN_VOLUME_RATIO
         except Exception as e:
-            logging.error(f"Ошибка при проверке ликвидности: {e}")
+            logging.error("Ошибка при проверке ликвидности: %s", e)
             return False
 
-    async def calculate_trade_size(self, stop_loss_price, entry_price):
+    async def _get_usdt_balance(self, field="walletBalance"):
+        """
+        Возвращает запрошенное поле баланса USDT.
+
+        Разбор ответа кошелька в индекс {монета: данные} делается один раз
+        и живёт ~1 секунду, поэтому соседние проверки в одном тике
+        не сканируют список монет заново.
+        """
         try:
-            # 🔥 Получаем баланс USDT
-            account_info = await self.api.get_wallet_balance(accountType="UNIFIED")
-            logging.info(f"API ответ get_wallet_balance: {account_info}")
-
-            # Проверяем баланс USDT
-            if account_info and "result" in account_info and "list" in account_info["result"]:
-                balance_info = account_info["result"]["list"][0]  # Берём первый объект в списке
-                if "coin" in balance_info:
-                    for item in balance_info["coin"]:
-                        if item["coin"].upper() == "USDT":
-                            balance = float(item["walletBalance"])
-                            logging.info(f"Обнаружен баланс USDT: {balance} USDT")
-                            break
-                    else:
-                        logging.error("USDT не найден в списке активов.")
-                        return None
-                else:
-                    logging.error("Ошибка: ключ 'coin' отсутствует в ответе API.")
-                    return None
+            now = time.monotonic()
+            if self._balance_cache is not None and now - self._balance_cache[0] < 1.0:
+                coins = self._balance_cache[1]
             else:
-                logging.error("Ошибка: некорректный ответ API при получении баланса.")
+                account_info = await self.api.get_wallet_balance(accountType="UNIFIED")
+                if not account_info or "result" not in account_info or "list" not in account_info["result"]:
+                    logging.error("Ошибка: некорректный ответ API при получении баланса.")
+                    return None
+                coin_list = account_info["result"]["list"][0].get("coin", [])
+                coins = {item["coin"].upper(): item for item in coin_list}
+                self._balance_cache = (now, coins)
+
+            item = coins.get("USDT")
+            if item is None:
+                logging.error("USDT не найден в списке активов.")
                 return None
+            return float(item[field])
+        except Exception as e:
+            logging.error("Ошибка при получении баланса USDT: %s", e)
+            return None
+
+    async def calculate_trade_size(self, stop_loss_price, entry_price, balance=None):
+        try:
+            # 🔥 Получаем баланс USDT, если вызывающий его ещё не достал
+            if balance is None:
+                balance = await self._get_usdt_balance()
+                if balance is None:
+                    return None
+            logging.info("Обнаружен баланс USDT: %s USDT", balance)
 
             # 🔢 Рассчёт риска и размера позиции в USDT
             risk_amount = balance * (RISK_PERCENTAGE / 100)  # Какой % от баланса используем в сделке
@@ -1294,7 +1709,7 @@ class TradingBot:
 
             return trade_size if trade_size >= 0.001 else None  # Проверка на минимальный размер
         except Exception as e:
-            logging.error(f"Ошибка при расчёте размера сделки: {e}")
+            logging.error("Ошибка при расчёте размера сделки: %s", e)
             return None
 
     async def check_stop_loss_distance(self, entry_price, stop_loss_price):
@@ -1303,7 +1718,7 @@ class TradingBot:
         """
         try:
             # Получаем минимальное расстояние для текущей пары
-            min_distance = MIN_STOP_DISTANCES.get(SYMBOL, 0.1)
+            min_distance = SYMBOL_MIN_STOP
             
             # Рассчитываем фактическое расстояние в процентах
             distance_percent = abs(entry_price - stop_loss_price) / entry_price * 100
@@ -1311,13 +1726,13 @@ class TradingBot:
             if distance_percent < min_distance:
                 error_msg = f"Расстояние до стоп-лосса ({distance_percent:.2f}%) меньше минимально допустимого ({min_distance}%)"
                 logging.warning(error_msg)
-                await send_telegram_message(f"⚠️ {error_msg}")
+                self.tg_queue.put_nowait(f"⚠️ {error_msg}")
                 return False
                 
             return True
             
         except Exception as e:
-            logging.error(f"Ошибка при проверке расстояния стоп-лосса: {e}")
+            logging.error("Ошибка при проверке расстояния стоп-лосса: %s", e)
             return False
 
     async def calculate_stop_loss(self, side, entry_price, atr=None):
@@ -1326,8 +1741,8 @@ class TradingBot:
         """
         try:
             # Получаем минимальное расстояние для текущей пары
-            min_distance = MIN_STOP_DISTANCES.get(SYMBOL, 0.1)
-            
+            min_distance = SYMBOL_MIN_STOP
+
             # Рассчитываем стоп-лосс на основе ATR или процента
             if atr:
                 distance = atr * ATR_MULTIPLIER
@@ -1337,14 +1752,15 @@ class TradingBot:
             else:
                 # Используем процентный стоп-лосс
                 distance = entry_price * (max(STOP_LOSS_PERCENTAGE, min_distance) / 100)
+
+            # Знак стороны вместо ветвления: для Buy стоп ниже входа, для Sell выше
+            sign = 1.0 if side == "Buy" else -1.0
+            stop_loss = entry_price - sign * distance
             
-            # Рассчитываем стоп-лосс в зависимости от стороны
-            stop_loss = entry_price - distance if side == "Buy" else entry_price + distance
-            
-            logging.info(f"Рассчитан стоп-лосс: {stop_loss:.2f} (расстояние: {(distance/entry_price*100):.2f}%)")
+            logging.info("Рассчитан стоп-лосс: %.2f (расстояние: %.2f%%)", stop_loss, (distance/entry_price*100))
             return stop_loss
         except Exception as e:
-            logging.error(f"Ошибка при расчете стоп-лосса: {e}")
+            logging.error("Ошибка при расчете стоп-лосса: %s", e)
             return None
 
     async def analyze_orderbook(self, side):
@@ -1352,30 +1768,26 @@ class TradingBot:
         Анализирует стакан заявок для определения дисбаланса
         """
         try:
-            orderbook = await self.api.get_orderbook(category="linear", symbol=SYMBOL, limit=ORDERBOOK_DEPTH)
-            
-            if "result" in orderbook:
-                bids = orderbook["result"]["b"]
-                asks = orderbook["result"]["a"]
-                
-                # Считаем общий объем на покупку и продажу
-                total_bids = sum(float(order["size"]) for order in bids)
-                total_asks = sum(float(order["size"]) for order in asks)
-                
-                # Проверяем наличие крупных стен
-                large_bids = sum(float(order["size"]) for order in bids if float(order["size"]) > VOLUME_THRESHOLD)
-                large_asks = sum(float(order["size"]) for order in asks if float(order["size"]) > VOLUME_THRESHOLD)
-                
-                if side == "Buy":
-                    return (total_bids > total_asks * MIN_VOLUME_RATIO and 
-                           large_bids > large_asks * 1.5)
-                else:
-                    return (total_asks > total_bids * MIN_VOLUME_RATIO and 
-                           large_asks > large_bids * 1.5)
-            
-            return False
+            bid_sizes, ask_sizes = await self._get_orderbook_sizes()
+            if bid_sizes is None:
+                return False
+
+            # Считаем общий объем на покупку и продажу
+            total_bids = bid_sizes.sum()
+            total_asks = ask_sizes.sum()
+
+            # Проверяем наличие крупных стен
+            large_bids = bid_sizes[bid_sizes > VOLUME_THRESHOLD].sum()
+            large_asks = ask_sizes[ask_sizes > VOLUME_THRESHOLD].sum()
+
+            if side == "Buy":
+                return (total_bids > total_asks * MIN_VOLUME_RATIO and
+                       large_bids > large_asks * 1.5)
+            else:
+                return (total_asks > total_bids * MIN_VOLUME_RATIO and
+                       large_asks > large_bids * 1.5)
         except Exception as e:
-            logging.error(f"Ошибка при анализе стакана: {e}")
+            logging.error("Ошибка при анализе стакана: %s", e)
             return False
 
     async def analyze_volume(self):
@@ -1387,21 +1799,16 @@ class TradingBot:
                 logging.error("Ошибка: API Bybit вернул некорректные данные о сделках")
                 return None
 
-            buy_volume = 0
-            sell_volume = 0
-
-            for trade in trades["result"]["list"]:
-                try:
-                    size = float(trade["execQty"])  # Размер сделки
-                    side = trade["side"]  # Buy / Sell
-
-                    if side == "Buy":
-                        buy_volume += size
-                    elif side == "Sell":
-                        sell_volume += size
-                except KeyError as e:
-                    logging.error(f"Ошибка при обработке сделки: {e}")
-                    continue
+            # Два массива и маскированные суммы вместо питоновского цикла
+            # с dict-лукапами и float() на каждую сделку
+            trades_list = trades["result"]["list"]
+            sizes = np.fromiter(
+                (float(t.get("execQty", 0)) for t in trades_list),
+                dtype=np.float64, count=len(trades_list)
+            )
+            sides = np.array([t.get("side", "") for t in trades_list])
+            buy_volume = sizes[sides == "Buy"].sum()
+            sell_volume = sizes[sides == "Sell"].sum()
 
             if buy_volume > sell_volume * MIN_VOLUME_RATIO:
                 return "Buy"
@@ -1410,7 +1817,7 @@ class TradingBot:
 
             return None
         except Exception as e:
-            logging.error(f"Ошибка при анализе объемов: {e}")
+            logging.error("Ошибка при анализе объемов: %s", e)
             return None
 
     async def calculate_vwap(self):
@@ -1419,21 +1826,35 @@ class TradingBot:
         """
         try:
             candles = await self.api.get_kline(category="linear", symbol=SYMBOL, interval=1, limit=VWAP_PERIOD)
-            
+
             if "result" in candles and "list" in candles["result"]:
-                total_volume = 0
-                total_price_volume = 0
-                
-                for candle in candles["result"]["list"]:
-                    volume = float(candle["volume"])
-                    price = float(candle["close"])
-                    total_volume += volume
-                    total_price_volume += price * volume
-                
-                return total_price_volume / total_volume if total_volume > 0 else None
+                rows = candles["result"]["list"]
+
+                # Внутри одной минутной свечи VWAP не меняется — отдаём кэш
+                cache_key = (SYMBOL, "1", rows[0][0]) if rows else None
+                cached = self._indicator_cache.get("vwap")
+                if cached is not None and cached[0] == cache_key:
+                    return cached[1]
+
+                # Свечи приходят списками [ts, open, high, low, close, volume, ...]:
+                # вытаскиваем close/volume одним проходом и считаем VWAP
+                # векторной свёрткой вместо поэлементных накоплений
+                arr = np.fromiter(
+                    (float(v) for row in rows for v in (row[4], row[5])),
+                    dtype=np.float64,
+                    count=len(rows) * 2
+                ).reshape(-1, 2)
+                closes = arr[:, 0]
+                volumes = arr[:, 1]
+
+                total_volume = volumes.sum()
+                vwap = float((closes * volumes).sum() / total_volume) if total_volume > 0 else None
+                if vwap is not None:
+                    self._indicator_cache["vwap"] = (cache_key, vwap)
+                return vwap
             return None
         except Exception as e:
-            logging.error(f"Ошибка при расчете VWAP: {e}")
+            logging.error("Ошибка при расчете VWAP: %s", e)
             return None
 
     async def calculate_position_size(self, account_balance, current_price, atr):
@@ -1465,7 +1886,7 @@ class TradingBot:
             return position_size
 
         except Exception as e:
-            logging.error(f"Ошибка при расчете размера позиции: {e}")
+            logging.error("Ошибка при расчете размера позиции: %s", e)
             return None
 
     TIMEFRAME_MAPPING = {
@@ -1474,41 +1895,66 @@ class TradingBot:
         "1M": "M"
     }
 
+    # TTL кэша исторических данных подобран под размер бара:
+    # дневки обновляем раз в час, недельки и месяцы — ещё реже
+    HIST_CACHE_TTL = {
+        "1D": 3600,
+        "1W": 21600,
+        "1M": 86400
+    }
+
     async def fetch_historical_data(self, timeframe="1D", limit=200):
         """
         Запрашивает исторические свечи по заданному таймфрейму.
-        Возвращает список цен закрытия (close).
+        Возвращает массив цен закрытия (close) как np.ndarray.
         """
         try:
+            # Бары старших таймфреймов меняются редко — переиспользуем ответ,
+            # пока не истёк TTL, и экономим HTTP-раунд на каждый анализ
+            now = time.monotonic()
+            cached = self._hist_cache.get(timeframe)
+            if cached is not None and now - cached[0] < self.HIST_CACHE_TTL.get(timeframe, 3600):
+                return cached[1]
+
             interval = self.TIMEFRAME_MAPPING.get(timeframe, "D")  # По умолчанию "D" (день)
             response = await self.api.get_kline(category="linear", symbol=SYMBOL, interval=interval, limit=limit)
-            
+
             if "result" in response and "list" in response["result"]:
-                closes = [float(candle[4]) for candle in response["result"]["list"]]
-                if not closes:
-                    logging.warning(f"⚠️ API не вернуло свечи для {timeframe}")
+                # Сразу отдаём ndarray: дальше серию жуют только numpy/talib,
+                # и каждая редукция обходится без повторной конвертации списка
+                rows = response["result"]["list"]
+                closes = np.fromiter((float(row[4]) for row in rows), dtype=np.float64, count=len(rows))
+                if not closes.size:
+                    logging.warning("⚠️ API не вернуло свечи для %s", timeframe)
+                else:
+                    self._hist_cache[timeframe] = (now, closes)
                 return closes
 
-            logging.warning(f"⚠️ Нет данных для {timeframe}")
-            return []
+            logging.warning("⚠️ Нет данных для %s", timeframe)
+            return np.empty(0)
         except Exception as e:
-            logging.error(f"❌ Ошибка получения данных {timeframe}: {e}")
-            return []
+            logging.error("❌ Ошибка получения данных %s: %s", timeframe, e)
+            return np.empty(0)
 
     async def get_support_resistance(self, closes):
         """
         Определяет ключевые уровни поддержки и сопротивления с фильтрацией выбросов.
         """
-        if not closes or len(closes) < 10:
+        if closes is None or len(closes) < 10:
             return None, None
 
-        # Фильтрация выбросов: убираем 5% самых низких и 5% самых высоких цен
-        lower_bound = np.percentile(closes, 5)
-        upper_bound = np.percentile(closes, 95)
+        # Фильтрация выбросов: убираем 5% самых низких и 5% самых высоких цен.
+        # partition ставит оба граничных элемента на место за O(n) introselect
+        # вместо полной сортировки внутри np.percentile
+        a = np.asarray(closes, dtype=np.float64)
+        k_lo = int(0.05 * len(a))
+        k_hi = min(int(0.95 * len(a)), len(a) - 1)
+        part = np.partition(a, [k_lo, k_hi])
+        lower_bound, upper_bound = part[k_lo], part[k_hi]
 
         # Получаем поддержку и сопротивление внутри этого диапазона
-        support = min([price for price in closes if price >= lower_bound])
-        resistance = max([price for price in closes if price <= upper_bound])
+        support = float(a[a >= lower_bound].min())
+        resistance = float(a[a <= upper_bound].max())
 
         return support, resistance
 
@@ -1519,11 +1965,12 @@ class TradingBot:
         if len(closes) < 10:
             return None
 
-        highs = [closes[i] for i in range(1, len(closes) - 1) if closes[i] > closes[i - 1] and closes[i] > closes[i + 1]]
-        lows = [closes[i] for i in range(1, len(closes) - 1) if closes[i] < closes[i - 1] and closes[i] < closes[i + 1]]
-
-        last_high = highs[-1] if highs else None
-        last_low = lows[-1] if lows else None
+        # Поиск последних локальных экстремумов вынесен в _pivot_scan:
+        # с numba это нативный цикл, без него — тот же алгоритм на Python
+        c = np.asarray(closes, dtype=np.float64)
+        last_high, last_low = _pivot_scan(c)
+        last_high = None if np.isnan(last_high) else float(last_high)
+        last_low = None if np.isnan(last_low) else float(last_low)
 
         # Определяем тренд на основе последних 10 свечей
         trend = "Боковик"
@@ -1533,17 +1980,20 @@ class TradingBot:
             elif last_low < last_high * 0.98:
                 trend = "Медвежий тренд 🔴"
 
-        logging.info(f"📊 Структура рынка: {trend}, High: {last_high}, Low: {last_low}")
+        logging.info("📊 Структура рынка: %s, High: %s, Low: %s", trend, last_high, last_low)
         return trend, last_high, last_low
 
     async def perform_long_term_analysis(self):
         """
         Выполняет долгосрочный анализ рынка.
         """
-        # 📊 Получаем исторические данные
-        closes_1D = await self.fetch_historical_data("1D", 200)
-        closes_1W = await self.fetch_historical_data("1W", 100)
-        closes_1M = await self.fetch_historical_data("1M", 50)
+        # 📊 Получаем исторические данные: три таймфрейма независимы,
+        # поэтому качаем их параллельно — один RTT вместо трёх
+        closes_1D, closes_1W, closes_1M = await asyncio.gather(
+            self.fetch_historical_data("1D", 200),
+            self.fetch_historical_data("1W", 100),
+            self.fetch_historical_data("1M", 50)
+        )
 
         # 🏆 Определяем уровни поддержки и сопротивления
         support_1D, resistance_1D = await self.get_support_resistance(closes_1D)
@@ -1562,13 +2012,17 @@ class TradingBot:
         market_trend_1D, last_high_1D, last_low_1D = await self.market_structure_analysis(closes_1D)
 
         # ✅ Логируем результаты
-        logging.info(f"""
-        📊 Долгосрочный анализ:
-        - 1D: Поддержка {support_1D}, Сопротивление {resistance_1D}, Тренд: {trend_1D}, Структура: {market_trend_1D}
-        - 1W: Поддержка {support_1W}, Сопротивление {resistance_1W}, Тренд: {trend_1W}
-        - 1M: Поддержка {support_1M}, Сопротивление {resistance_1M}, Тренд: {trend_1M}
-        - 🔥 Объёмный тренд: {volume_trend}
-        """)
+        logging.info(
+            "\n        📊 Долгосрочный анализ:\n"
+            "        - 1D: Поддержка %s, Сопротивление %s, Тренд: %s, Структура: %s\n"
+            "        - 1W: Поддержка %s, Сопротивление %s, Тренд: %s\n"
+            "        - 1M: Поддержка %s, Сопротивление %s, Тренд: %s\n"
+            "        - 🔥 Объёмный тренд: %s",
+            support_1D, resistance_1D, trend_1D, market_trend_1D,
+            support_1W, resistance_1W, trend_1W,
+            support_1M, resistance_1M, trend_1M,
+            volume_trend
+        )
 
         return {
             "support_resistance": {
@@ -1595,10 +2049,12 @@ class TradingBot:
             logging.warning("⚠️ Недостаточно данных для анализа тренда.")
             return None
 
-        sma_50 = talib.SMA(np.array(closes), timeperiod=50)[-1]
-        sma_200 = talib.SMA(np.array(closes), timeperiod=200)[-1]
-        ema_21 = talib.EMA(np.array(closes), timeperiod=21)[-1]
-        rsi = talib.RSI(np.array(closes), timeperiod=14)[-1]
+        # Конвертируем один раз и берём только последние значения
+        closes = np.asarray(closes, dtype=np.float64)
+        sma_50 = ta_stream.SMA(closes, timeperiod=50)
+        sma_200 = ta_stream.SMA(closes, timeperiod=200)
+        ema_21 = ta_stream.EMA(closes, timeperiod=21)
+        rsi = ta_stream.RSI(closes, timeperiod=14)
         
         trend = "Нейтральный"
         if sma_50 > sma_200 and ema_21 > sma_50:
@@ -1606,7 +2062,7 @@ class TradingBot:
         elif sma_50 < sma_200 and ema_21 < sma_50:
             trend = "Медвежий 🔴"
         
-        logging.info(f"📈 Тренд: {trend} (SMA50: {sma_50}, SMA200: {sma_200}, EMA21: {ema_21}, RSI: {rsi})")
+        logging.info("📈 Тренд: %s (SMA50: %s, SMA200: %s, EMA21: %s, RSI: %s)", trend, sma_50, sma_200, ema_21, rsi)
         return trend
 
     async def analyze_long_term_levels(self):
@@ -1614,17 +2070,26 @@ class TradingBot:
         Анализирует долгосрочные уровни поддержки и сопротивления
         """
         try:
-            # Запрашиваем свечи с разными интервалами
-            candles_1H = await self.api.get_kline(category="linear", symbol=SYMBOL, interval="60", limit=100)
-            candles_4H = await self.api.get_kline(category="linear", symbol=SYMBOL, interval="240", limit=100)
-            candles_1D = await self.api.get_kline(category="linear", symbol=SYMBOL, interval="D", limit=100)
+            # Запрашиваем свечи с разными интервалами параллельно: запросы независимы,
+            # поэтому ждём max(RTT) вместо суммы трёх RTT
+            candles_1H, candles_4H, candles_1D = await asyncio.gather(
+                self.api.get_kline(category="linear", symbol=SYMBOL, interval="60", limit=100),
+                self.api.get_kline(category="linear", symbol=SYMBOL, interval="240", limit=100),
+                self.api.get_kline(category="linear", symbol=SYMBOL, interval="D", limit=100),
+                return_exceptions=True
+            )
 
-            # Функция для извлечения цен закрытия из ответа API
+            # Функция для извлечения цен закрытия из ответа API:
+            # одна векторная конвертация вместо float() по каждой свече
             def extract_closes(candles):
+                if isinstance(candles, Exception):
+                    # Упавший запрос обрабатываем как пустой ответ
+                    logging.error("❌ Ошибка запроса свечей: %s", candles)
+                    return np.empty(0)
                 if candles and "result" in candles and "list" in candles["result"] and candles["result"]["list"]:
-                    return [float(candle[4]) for candle in reversed(candles["result"]["list"])]
+                    return np.asarray([row[4] for row in candles["result"]["list"]], dtype=np.float64)[::-1]
                 else:
-                    return []
+                    return np.empty(0)
 
             # Извлекаем данные
             closes_1H = extract_closes(candles_1H)
@@ -1632,46 +2097,46 @@ class TradingBot:
             closes_1D = extract_closes(candles_1D)
 
             # Логируем последние свечи для отладки
-            if closes_1H:
-                logging.info(f"🧐 Данные свечей 1H: {closes_1H[-5:]}")
-            if closes_4H:
-                logging.info(f"🧐 Данные свечей 4H: {closes_4H[-5:]}")
-            if closes_1D:
-                logging.info(f"🧐 Данные свечей 1D: {closes_1D[-5:]}")
+            if closes_1H.size:
+                logging.info("🧐 Данные свечей 1H: %s", closes_1H[-5:])
+            if closes_4H.size:
+                logging.info("🧐 Данные свечей 4H: %s", closes_4H[-5:])
+            if closes_1D.size:
+                logging.info("🧐 Данные свечей 1D: %s", closes_1D[-5:])
 
             # Проверяем наличие данных
-            if not closes_1H:
+            if not closes_1H.size:
                 logging.warning("⚠️ Недостаточно данных для анализа уровней на 1H!")
-            if not closes_4H:
+            if not closes_4H.size:
                 logging.warning("⚠️ Недостаточно данных для анализа уровней на 4H!")
-            if not closes_1D:
+            if not closes_1D.size:
                 logging.warning("⚠️ Недостаточно данных для анализа уровней на 1D!")
 
             # Определяем уровни поддержки и сопротивления для каждого таймфрейма
             levels = {}
 
-            if closes_1H:
+            if closes_1H.size:
                 support_1H, resistance_1H = await self.detect_support_resistance(closes_1H)
                 if support_1H and resistance_1H:
                     levels["1H"] = {"support": support_1H, "resistance": resistance_1H}
-                    logging.info(f"🔵 1H: Support: {support_1H:.2f}, Resistance: {resistance_1H:.2f}")
+                    logging.info("🔵 1H: Support: %.2f, Resistance: %.2f", support_1H, resistance_1H)
 
-            if closes_4H:
+            if closes_4H.size:
                 support_4H, resistance_4H = await self.detect_support_resistance(closes_4H)
                 if support_4H and resistance_4H:
                     levels["4H"] = {"support": support_4H, "resistance": resistance_4H}
-                    logging.info(f"🟢 4H: Support: {support_4H:.2f}, Resistance: {resistance_4H:.2f}")
+                    logging.info("🟢 4H: Support: %.2f, Resistance: %.2f", support_4H, resistance_4H)
 
-            if closes_1D:
+            if closes_1D.size:
                 support_1D, resistance_1D = await self.detect_support_resistance(closes_1D)
                 if support_1D and resistance_1D:
                     levels["1D"] = {"support": support_1D, "resistance": resistance_1D}
-                    logging.info(f"🔴 1D: Support: {support_1D:.2f}, Resistance: {resistance_1D:.2f}")
+                    logging.info("🔴 1D: Support: %.2f, Resistance: %.2f", support_1D, resistance_1D)
 
             return levels if levels else None
 
         except Exception as e:
-            logging.error(f"❌ Ошибка при анализе долгосрочных уровней: {e}")
+            logging.error("❌ Ошибка при анализе долгосрочных уровней: %s", e)
             return None
 
     async def detect_support_resistance(self, closes):
@@ -1679,14 +2144,15 @@ class TradingBot:
         Находит ближайшие уровни поддержки и сопротивления.
         """
         try:
-            if not closes or len(closes) < 10:
+            if closes is None or len(closes) < 10:
                 return None, None
-            
-            high = max(closes)
-            low = min(closes)
-            return low, high
+
+            # Редукции выполняются в C по непрерывному массиву,
+            # а не питоновским max/min по элементам
+            arr = np.asarray(closes, dtype=np.float64)
+            return float(arr.min()), float(arr.max())
         except Exception as e:
-            logging.error(f"Ошибка при определении уровней поддержки/сопротивления: {e}")
+            logging.error("Ошибка при определении уровней поддержки/сопротивления: %s", e)
             return None, None
 
     async def check_positions(self):
@@ -1695,34 +2161,37 @@ class TradingBot:
         """
         try:
             positions = await self.api.get_positions()
-            
-            # Проверяем наличие ошибок в ответе API
-            if not positions or "result" not in positions or "list" not in positions["result"]:
+
+            # EAFP: прямое индексирование вместо цепочки .get() —
+            # на каждом тике run() счастливый путь обходится без
+            # лишних вызовов методов, а битый ответ ловит except ниже
+            try:
+                position_list = positions["result"]["list"]
+            except (KeyError, TypeError):
                 logging.info("📉 Нет открытых позиций.")
                 self.active_position = False
                 self.current_position = None
                 return True
 
-            position_list = positions["result"]["list"]
             if not position_list:
                 logging.info("📉 Нет активных позиций.")
                 self.active_position = False
                 self.current_position = None
                 return True
 
-            # Проверяем каждую позицию
+            # Проверяем каждую позицию; поля вынимаем один раз
             for position in position_list:
-                size = float(position.get("size", 0))
-                side = position.get("side", "")
-                
+                size = float(position["size"] or 0)
+                side = position["side"]
+
                 if size == 0:
                     continue
 
                 # Проверяем, что это наша позиция
-                if (self.current_position and 
+                if (self.current_position and
                     self.current_position.get("side") == side and
                     abs(size - self.current_position.get("size", 0)) < 0.001):
-                    
+
                     # Обновляем информацию о позиции
                     self.current_position.update({
                         "size": size,
@@ -1732,7 +2201,7 @@ class TradingBot:
                     })
                     
                     self.active_position = True
-                    logging.info(f"🔵 Активная позиция обновлена: {self.current_position}")
+                    logging.info("🔵 Активная позиция обновлена: %s", self.current_position)
                     return True
 
             # Если мы дошли до этой точки, значит активной позиции нет
@@ -1744,7 +2213,7 @@ class TradingBot:
         except Exception as e:
             error_msg = f"Ошибка при проверке позиций: {e}"
             logging.error(error_msg)
-            await send_telegram_message(f"⚠ {error_msg}")
+            self.tg_queue.put_nowait(f"⚠ {error_msg}")
             self.active_position = False
             self.current_position = None
             return False
@@ -1799,8 +2268,8 @@ class TradingBot:
         except asyncio.CancelledError:
             logging.info("Мониторинг позиций остановлен")
         except Exception as e:
-            logging.error(f"Ошибка в мониторинге позиций: {e}")
-            await send_telegram_message(f"⚠️ Ошибка в мониторинге позиций: {e}")
+            logging.error("Ошибка в мониторинге позиций: %s", e)
+            self.tg_queue.put_nowait(f"⚠️ Ошибка в мониторинге позиций: {e}")
 
     async def monitor_positions(self):
         """
@@ -1813,7 +2282,7 @@ class TradingBot:
                 return
 
             current_price = float(indicators['last_close'])
-            atr = float(indicators['ATR'][-1])
+            atr = float(indicators['ATR'])
 
             # Получаем открытые позиции
             positions = read_json_file('positions.json')
@@ -1830,7 +2299,7 @@ class TradingBot:
                     close_size = await self.partial_close_position(position, current_price, atr)
                     if close_size:
                         # Закрываем часть позиции
-                        order = await self.api.place_order(
+                        order = await self.api.create_order(
                             category="linear",
                             symbol=SYMBOL,
                             side="Sell" if position['side'] == "Buy" else "Buy",
@@ -1860,15 +2329,16 @@ class TradingBot:
                                 message += f"Закрыто: {close_size}\n"
                                 message += f"Осталось: {position['size']}\n"
                                 message += f"Цена: {current_price}"
-                                await send_telegram_message(message)
+                                self.tg_queue.put_nowait(message)
 
                     # Проверяем трейлинг-стоп
-                    new_stop = await self.update_trailing_stop(position, current_price, atr)
+                    new_stop = await self._trailing_stop_target(position, current_price, atr)
                     if new_stop and new_stop != position['stopLoss']:
                         # Обновляем стоп-лосс
-                        await self.api.set_stop_loss(
+                        await self.api.set_trading_stop(
                             category="linear",
                             symbol=SYMBOL,
+                            side=position['side'],
                             stopLoss=str(new_stop)
                         )
                         position['stopLoss'] = new_stop
@@ -1878,14 +2348,14 @@ class TradingBot:
                         message = f"📈 Обновлен трейлинг-стоп для {position['side']} позиции:\n"
                         message += f"Новый стоп: {new_stop}\n"
                         message += f"Текущая цена: {current_price}"
-                        await send_telegram_message(message)
+                        self.tg_queue.put_nowait(message)
 
                 except Exception as e:
-                    logging.error(f"Ошибка при мониторинге позиции: {e}")
+                    logging.error("Ошибка при мониторинге позиции: %s", e)
                     continue
 
         except Exception as e:
-            logging.error(f"Ошибка при мониторинге позиций: {e}")
+            logging.error("Ошибка при мониторинге позиций: %s", e)
 
     async def calculate_indicators(self):
         """
@@ -1908,19 +2378,17 @@ class TradingBot:
                 logging.warning("Недостаточно данных для анализа")
                 return None
 
-            # Рассчитываем индикаторы
-            rsi = talib.RSI(closes, timeperiod=14)[-1]
-            atr = talib.ATR(highs, lows, closes, timeperiod=14)[-1]
-            
-            # Рассчитываем VWAP
+            # Рассчитываем индикаторы (нужны только последние значения)
+            rsi = ta_stream.RSI(closes, timeperiod=14)
+            atr = ta_stream.ATR(highs, lows, closes, timeperiod=14)
+
+            # Рассчитываем VWAP: достаточно итоговых сумм, без cumsum-массивов
             typical_price = (highs + lows + closes) / 3
-            cumulative_vp = np.cumsum(typical_price * volumes)
-            cumulative_volume = np.cumsum(volumes)
-            vwap = cumulative_vp[-1] / cumulative_volume[-1]
+            vwap = (typical_price * volumes).sum() / volumes.sum()
 
             # Рассчитываем SMA для определения тренда
-            sma20 = talib.SMA(closes, timeperiod=20)[-1]
-            sma50 = talib.SMA(closes, timeperiod=50)[-1]
+            sma20 = ta_stream.SMA(closes, timeperiod=20)
+            sma50 = ta_stream.SMA(closes, timeperiod=50)
 
             # Рассчитываем уровни поддержки и сопротивления
             support_resistance = await self.get_support_resistance(closes)
@@ -1939,7 +2407,7 @@ class TradingBot:
             }
 
         except Exception as e:
-            logging.error(f"Ошибка при расчете индикаторов: {e}")
+            logging.error("Ошибка при расчете индикаторов: %s", e)
             return None
 
     async def check_entry_conditions(self, indicators):
@@ -1990,7 +2458,7 @@ class TradingBot:
             return None
 
         except Exception as e:
-            logging.error(f"Ошибка при проверке условий входа: {e}")
+            logging.error("Ошибка при проверке условий входа: %s", e)
             return None
 
     async def calculate_sl_tp(self, side, price, atr):
@@ -2008,7 +2476,7 @@ class TradingBot:
                 take_profit_3 = price + atr * 3
                 
                 # Проверяем минимальное расстояние для стоп-лосса
-                min_distance = MIN_STOP_DISTANCES.get(SYMBOL, 0.1)
+                min_distance = SYMBOL_MIN_STOP
                 min_stop_distance = price * (min_distance / 100)
                 if (price - stop_loss) < min_stop_distance:
                     stop_loss = price - min_stop_distance
@@ -2023,7 +2491,7 @@ class TradingBot:
                 take_profit_3 = price - atr * 3
                 
                 # Проверяем минимальное расстояние для стоп-лосса
-                min_distance = MIN_STOP_DISTANCES.get(SYMBOL, 0.1)
+                min_distance = SYMBOL_MIN_STOP
                 min_stop_distance = price * (min_distance / 100)
                 if (stop_loss - price) < min_stop_distance:
                     stop_loss = price + min_stop_distance
@@ -2036,12 +2504,12 @@ class TradingBot:
             }
 
         except Exception as e:
-            logging.error(f"Ошибка при расчете SL/TP: {e}")
+            logging.error("Ошибка при расчете SL/TP: %s", e)
             return None
 
-    async def update_trailing_stop(self, position, current_price, atr):
+    async def _trailing_stop_target(self, position, current_price, atr):
         """
-        Обновляет трейлинг-стоп на основе текущей цены и ATR
+        Считает целевой трейлинг-стоп на основе текущей цены и ATR
         """
         try:
             if not position or not current_price or not atr:
@@ -2071,7 +2539,7 @@ class TradingBot:
             return current_stop
 
         except Exception as e:
-            logging.error(f"Ошибка при обновлении трейлинг-стопа: {e}")
+            logging.error("Ошибка при обновлении трейлинг-стопа: %s", e)
             return None
 
     async def partial_close_position(self, position, current_price, atr):
@@ -2119,7 +2587,7 @@ class TradingBot:
             return None
 
         except Exception as e:
-            logging.error(f"Ошибка при частичном закрытии позиции: {e}")
+            logging.error("Ошибка при частичном закрытии позиции: %s", e)
             return None
 
     async def execute_trade(self, side):
@@ -2135,27 +2603,16 @@ class TradingBot:
 
             # Получаем текущую цену и ATR
             current_price = float(indicators['last_close'])
-            atr = float(indicators['ATR'][-1])
+            atr = float(indicators['ATR'])
 
             # Проверяем условия входа
             entry_conditions = await self.check_entry_conditions(indicators)
             if not entry_conditions or entry_conditions != side:
-                logging.info(f"Условия для входа в {side} не выполнены")
-                return False
-
-            # Получаем баланс аккаунта
-            account_info = await self.api.get_wallet_balance(accountType="UNIFIED")
-            if "result" not in account_info or "list" not in account_info["result"]:
-                logging.error("Не удалось получить информацию о балансе")
+                logging.info("Условия для входа в %s не выполнены", side)
                 return False
 
             # Получаем доступный баланс USDT
-            available_balance = None
-            for coin in account_info["result"]["list"][0].get("coin", []):
-                if coin["coin"].upper() == "USDT":
-                    available_balance = float(coin["availableBalance"])
-                    break
-
+            available_balance = await self._get_usdt_balance("availableBalance")
             if available_balance is None:
                 logging.error("Не удалось получить баланс USDT")
                 return False
@@ -2173,7 +2630,7 @@ class TradingBot:
                 return False
 
             # Открываем позицию
-            order = await self.api.place_order(
+            order = await self.api.create_order(
                 category="linear",
                 symbol=SYMBOL,
                 side=side,
@@ -2184,7 +2641,7 @@ class TradingBot:
             )
 
             if "result" not in order:
-                logging.error(f"Ошибка при открытии позиции: {order}")
+                logging.error("Ошибка при открытии позиции: %s", order)
                 return False
 
             # Сохраняем информацию о позиции
@@ -2213,19 +2670,19 @@ class TradingBot:
             message += f"Размер: {position_size}\n"
             message += f"Стоп-лосс: {sl_tp['stop_loss']}\n"
             message += f"Тейк-профиты: {sl_tp['take_profit_1']}, {sl_tp['take_profit_2']}, {sl_tp['take_profit_3']}"
-            await send_telegram_message(message)
+            self.tg_queue.put_nowait(message)
 
             return True
 
         except Exception as e:
-            logging.error(f"Ошибка при выполнении торговой операции: {e}")
+            logging.error("Ошибка при выполнении торговой операции: %s", e)
             return False
 
 def initialize_json_files():
     """Инициализирует JSON файлы с дефолтными значениями"""
     try:
         # Инициализация balance.json
-        if not os.path.exists('balance.json'):
+        if not os.path.exists(_storage_path('balance.json')):
             balance_data = {
                 "balance": 0,
                 "equity": 0,
@@ -2242,7 +2699,7 @@ def initialize_json_files():
             logging.info("✅ Создан файл balance.json")
 
         # Инициализация indicators.json
-        if not os.path.exists('indicators.json'):
+        if not os.path.exists(_storage_path('indicators.json')):
             indicators_data = {
                 "vwap": 0,
                 "rsi": 0,
@@ -2256,7 +2713,7 @@ def initialize_json_files():
             logging.info("✅ Создан файл indicators.json")
 
         # Инициализация positions.json
-        if not os.path.exists('positions.json'):
+        if not os.path.exists(_storage_path('positions.json')):
             positions_data = {
                 "positions": [],
                 "last_updated": datetime.now().isoformat()
@@ -2265,7 +2722,7 @@ def initialize_json_files():
             logging.info("✅ Создан файл positions.json")
 
         # Инициализация pnl.json
-        if not os.path.exists('pnl.json'):
+        if not os.path.exists(_storage_path('pnl.json')):
             pnl_data = {
                 "daily": 0,
                 "trades": [],
@@ -2275,7 +2732,7 @@ def initialize_json_files():
             logging.info("✅ Создан файл pnl.json")
 
         # Инициализация price.json
-        if not os.path.exists('price.json'):
+        if not os.path.exists(_storage_path('price.json')):
             price_data = {
                 "price": 0,
                 "last_updated": datetime.now().isoformat()
@@ -2284,7 +2741,7 @@ def initialize_json_files():
             logging.info("✅ Создан файл price.json")
 
         # Инициализация signals.json
-        if not os.path.exists('signals.json'):
+        if not os.path.exists(_storage_path('signals.json')):
             signals_data = {
                 "refresh_data": False,
                 "last_updated": datetime.now().isoformat()
@@ -2295,7 +2752,7 @@ def initialize_json_files():
         logging.info("✅ Все JSON файлы успешно инициализированы")
         return True
     except Exception as e:
-        logging.error(f"❌ Ошибка при инициализации JSON файлов: {e}")
+        logging.error("❌ Ошибка при инициализации JSON файлов: %s", e)
         return False
 
 async def main():
@@ -2324,17 +2781,21 @@ async def main():
     # Создаем и запускаем бота внутри event loop
     bot = TradingBot()
     bot_running = True
-    
+
     try:
+        if not await bot.start():
+            logging.error("❌ Ошибка установки плеча, бот не может продолжить работу")
+            return
         await bot.run()
     except KeyboardInterrupt:
         logging.info("Бот остановлен пользователем")
         bot_running = False
     except Exception as e:
-        logging.error(f"Критическая ошибка в работе бота: {e}")
+        logging.error("Критическая ошибка в работе бота: %s", e)
         bot_running = False
     finally:
         bot_running = False
+        await close_http_session()
         logging.info("Завершение работы бота")
 
 if __name__ == "__main__":
@@ -1,38 +1,70 @@
 import asyncio
 import sys
-import json
+import struct
+import time
 from datetime import datetime
+from functools import partial
+
+import msgspec
 
 # ✅ Исправляем ошибку "aiodns needs a SelectorEventLoop on Windows"
 if sys.platform == "win32":
     asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+else:
+    # uvloop (libuv) в разы снижает накладные расходы event loop под
+    # шквалом callback'ов; на Windows его нет, поэтому импорт опционален
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
 
+import atexit
 import logging
+import logging.handlers
+import queue
 from aiogram import Bot, Dispatcher, types, F
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.filters import Command, CommandStart
+from aiogram.filters.callback_data import CallbackData
 from aiogram import Router
 from dotenv import load_dotenv
 import os
 from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+# Настройка логирования: обработчики в корутинах только кладут запись в
+# очередь, а фоновый поток QueueListener пишет на диск — event loop не
+# блокируется на синхронных write()
+_log_queue = queue.SimpleQueue()
+_log_listener = logging.handlers.QueueListener(
+    _log_queue,
+    logging.handlers.RotatingFileHandler('telegram_bot.log', maxBytes=5_000_000, backupCount=3),
+    logging.StreamHandler()
+)
+_log_listener.start()
+atexit.register(_log_listener.stop)
 
-# Настройка логирования
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('telegram_bot.log'),
-        logging.StreamHandler()
-    ]
+    handlers=[logging.handlers.QueueHandler(_log_queue)]
 )
 
+# Сломавшийся handler не должен ронять исключение в рабочий код
+logging.raiseExceptions = False
+
+# Кэшированная ссылка на логгер: дешевле, чем диспетчеризация через
+# logging.<level> с поиском root-логгера на каждый вызов
+logger = logging.getLogger("telegram_bot")
+
 load_dotenv()
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 SYMBOL = os.getenv("SYMBOL", "BTCUSDT")
 
 if not all([TELEGRAM_CHAT_ID, TELEGRAM_BOT_TOKEN]):
-    logging.error("❌ Не заданы TELEGRAM_BOT_TOKEN или TELEGRAM_CHAT_ID в .env файле")
+    logger.error("❌ Не заданы TELEGRAM_BOT_TOKEN или TELEGRAM_CHAT_ID в .env файле")
     sys.exit(1)
 
 bot = Bot(token=TELEGRAM_BOT_TOKEN)
@@ -74,162 +106,166 @@ commands_keyboard = types.ReplyKeyboardMarkup(
     resize_keyboard=True
 )
 
+# MessagePack-хранилище: msgspec сериализует в разы быстрее stdlib json,
+# а 4-байтовый big-endian заголовок длины позволяет дописывать записи в хвост
+_MSGPACK_ENCODER = msgspec.msgpack.Encoder()
+_MSGPACK_DECODER = msgspec.msgpack.Decoder()
+_LEN_HEADER = struct.Struct(">I")
+
+def _storage_path(filename: str) -> str:
+    """Преобразует старое имя *.json в фактический путь *.msgpack"""
+    if filename.endswith('.json'):
+        return filename[:-len('.json')] + '.msgpack'
+    return filename
+
+def _pack_payload(data: dict) -> bytes:
+    """Кодирует данные в msgpack с заголовком длины"""
+    payload = _MSGPACK_ENCODER.encode(data)
+    return _LEN_HEADER.pack(len(payload)) + payload
+
+# Начальные структуры файлов статичны — сериализуем их один раз при импорте
+_DEFAULT_OBJS = {
+    'balance.json': {
+        "balance": 0,
+        "used_margin": 0,
+        "free_margin": 0,
+        "last_updated": "Неизвестно"
+    },
+    'price.json': {"price": 0},
+    'positions.json': {"positions": [], "last_updated": "Неизвестно"},
+    'pnl.json': {"daily": 0, "trades": [], "last_updated": "Неизвестно"},
+}
+_DEFAULT_BYTES = {k: _pack_payload(v) for k, v in _DEFAULT_OBJS.items()}
+_EMPTY_BYTES = _pack_payload({})
+
 def read_json_file(filename: str) -> dict:
-    """Читает JSON файл и создаёт его, если его нет"""
+    """Читает данные из msgpack-файла и создаёт его, если его нет"""
+    path = _storage_path(filename)
     try:
-        with open(filename, 'r') as f:
-            data = json.load(f)
-        
+        with open(path, 'rb') as f:
+            raw = f.read()
+        data = _MSGPACK_DECODER.decode(raw[_LEN_HEADER.size:])
+
         # 🔥 Логируем содержимое файла перед возвратом
-        logging.info(f"📂 Данные из {filename}: {data}")
+        logger.info("📂 Данные из %s: %s", filename, data)
         return data
     except FileNotFoundError:
-        logging.warning(f"⚠️ Файл {filename} не найден, создаём пустой.")
-        # Создаём файл с начальными значениями в зависимости от типа файла
-        default_data = {}
-        if filename == 'balance.json':
-            default_data = {
-                "balance": 0,
-                "used_margin": 0,
-                "free_margin": 0,
-                "last_updated": "Неизвестно"
-            }
-        elif filename == 'price.json':
-            default_data = {"price": 0}
-        elif filename == 'positions.json':
-            default_data = {"positions": [], "last_updated": "Неизвестно"}
-        elif filename == 'pnl.json':
-            default_data = {"daily": 0, "trades": [], "last_updated": "Неизвестно"}
-        
-        with open(filename, 'w') as f:
-            json.dump(default_data, f, indent=2)
-        return default_data
-    except json.JSONDecodeError:
-        logging.error(f"❌ Ошибка чтения JSON из файла {filename}, сбрасываем содержимое.")
-        with open(filename, 'w') as f:
-            json.dump({}, f)
+        logger.warning("⚠️ Файл %s не найден, создаём пустой.", filename)
+        # Один поиск по словарю вместо цепочки elif; payload уже сериализован
+        payload = _DEFAULT_BYTES.get(filename, _EMPTY_BYTES)
+        _atomic_write(path, payload)
+        # Декодируем payload обратно: получается полностью свежая структура,
+        # и мутации вложенных списков не трогают общие дефолты
+        return _MSGPACK_DECODER.decode(payload[_LEN_HEADER.size:])
+    except msgspec.DecodeError:
+        # Благодаря атомарной записи сюда можно попасть только при внешней
+        # порче файла — содержимое не трогаем, просто отдаём пустой словарь
+        logger.error("❌ Ошибка чтения msgpack из файла %s", filename)
         return {}
 
+def _atomic_write(path: str, payload: bytes) -> None:
+    """Атомарно записывает payload: сначала во временный файл, затем os.replace"""
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
 def write_json_file(filename: str, data: dict) -> bool:
-    """Записывает данные в JSON файл"""
+    """Записывает данные в msgpack-файл"""
     try:
-        with open(filename, 'w') as f:
-            json.dump(data, f, indent=2)
+        _atomic_write(_storage_path(filename), _pack_payload(data))
         return True
     except Exception as e:
-        logging.error(f"❌ Ошибка записи в файл {filename}: {e}")
+        logger.error("❌ Ошибка записи в файл %s: %s", filename, e)
         return False
 
 def update_json_file(filename: str, data: dict) -> bool:
-    """Обновляет JSON файл, добавляя временную метку"""
+    """Обновляет msgpack-файл, добавляя временную метку"""
     try:
         # Добавляем временную метку к данным
         data['last_updated'] = datetime.now().isoformat()
-        
-        # Записываем обновленные данные
-        with open(filename, 'w') as f:
-            json.dump(data, f, indent=2)
-            
-        logging.info(f"✅ Файл {filename} успешно обновлен")
+
+        # Записываем обновленные данные атомарно
+        _atomic_write(_storage_path(filename), _pack_payload(data))
+
+        logger.info("✅ Файл %s успешно обновлен", filename)
         return True
     except Exception as e:
-        logging.error(f"❌ Ошибка обновления файла {filename}: {e}")
+        logger.error("❌ Ошибка обновления файла %s: %s", filename, e)
         return False
 
+class Position(msgspec.Struct, omit_defaults=True):
+    """Типизированная схема позиции: декодер msgspec приводит поля к нужным
+    типам один раз, дальше идут обращения к готовым слотам без float()/int()"""
+    symbol: str = 'Unknown'
+    side: str = ''
+    size: float = 0.0
+    avgPrice: float = 0.0
+    leverage: int = 1
+    unrealisedPnl: float = 0.0
+    stopLoss: float = 0.0
+    takeProfit1: float = 0.0
+    takeProfit2: float = 0.0
+    takeProfit3: float = 0.0
+    trailing_stop: float | None = None
+    partial_closes: list | None = None
+
+class Trade(msgspec.Struct, omit_defaults=True):
+    """Типизированная схема закрытой сделки для format_pnl"""
+    symbol: str = 'Unknown'
+    side: str = 'Unknown'
+    closedPnl: float = 0.0
+    avgEntryPrice: float = 0.0
+    avgExitPrice: float = 0.0
+
+def _format_one_position(p: Position) -> str:
+    """Форматирует одну позицию (пустую строку для пустых позиций)"""
+    if p.size == 0 or not p.side:
+        logger.warning("⚠️ Пропущена пустая позиция: %s", p)
+        return ""
+
+    message = f"🔹 {p.symbol}: {p.side} {p.size} @ {p.avgPrice:.2f} (x{p.leverage})\n"
+    message += f"   📊 PnL: {p.unrealisedPnl:.2f} USDT\n"
+    message += f"   🛑 Стоп-лосс: {p.stopLoss:.2f}\n"
+    message += f"   🎯 Тейк-профиты:\n"
+    message += f"      TP1: {p.takeProfit1:.2f}\n"
+    message += f"      TP2: {p.takeProfit2:.2f}\n"
+    message += f"      TP3: {p.takeProfit3:.2f}\n"
+
+    # Добавляем информацию о трейлинг-стопе
+    if p.trailing_stop:
+        message += f"   📈 Трейлинг-стоп: {p.trailing_stop:.2f}\n"
+
+    # Добавляем информацию о частичном закрытии
+    if p.partial_closes:
+        message += f"   🔄 Частичные закрытия:\n"
+        for close in p.partial_closes:
+            message += f"      {close['size']} @ {close['price']:.2f}\n"
+
+    return message
+
 def format_positions(positions: list) -> str:
     """Форматирует список позиций в читаемый текст"""
     if not positions:
         return "📂 Нет открытых позиций"
-    
-    message = "📂 Открытые позиции:\n"
-    
-    # Если positions это словарь (одна позиция)
+
+    # Одна позиция в виде словаря — оборачиваем в список
     if isinstance(positions, dict):
+        positions = [positions]
+
+    message = "📂 Открытые позиции:\n"
+    for pos in positions:
         try:
-            # Безопасное получение значений с преобразованием типов
-            symbol = positions.get('symbol', 'Unknown')
-            side = positions.get('side', 'Unknown')
-            qty = float(positions.get('size', 0))
-            entry = float(positions.get('avgPrice', 0))
-            leverage = int(positions.get('leverage', 1))
-            unrealized_pnl = float(positions.get('unrealisedPnl', 0))
-            stop_loss = float(positions.get('stopLoss', 0))
-            take_profit_1 = float(positions.get('takeProfit1', 0))
-            take_profit_2 = float(positions.get('takeProfit2', 0))
-            take_profit_3 = float(positions.get('takeProfit3', 0))
-            
-            # Пропускаем пустые позиции
-            if qty == 0 or not side:
-                logging.warning(f"⚠️ Пропущена пустая позиция: {positions}")
-                return "📂 Нет открытых позиций"
-            
-            message += f"🔹 {symbol}: {side} {qty} @ {entry:.2f} (x{leverage})\n"
-            message += f"   📊 PnL: {unrealized_pnl:.2f} USDT\n"
-            message += f"   🛑 Стоп-лосс: {stop_loss:.2f}\n"
-            message += f"   🎯 Тейк-профиты:\n"
-            message += f"      TP1: {take_profit_1:.2f}\n"
-            message += f"      TP2: {take_profit_2:.2f}\n"
-            message += f"      TP3: {take_profit_3:.2f}\n"
-            
-            # Добавляем информацию о трейлинг-стопе
-            if positions.get('trailing_stop'):
-                message += f"   📈 Трейлинг-стоп: {positions['trailing_stop']:.2f}\n"
-            
-            # Добавляем информацию о частичном закрытии
-            if positions.get('partial_closes'):
-                message += f"   🔄 Частичные закрытия:\n"
-                for close in positions['partial_closes']:
-                    message += f"      {close['size']} @ {close['price']:.2f}\n"
-            
+            p = msgspec.convert(pos, Position, strict=False)
+            formatted = _format_one_position(p)
+            if formatted:
+                message += formatted + "\n"  # Пустая строка между позициями
         except Exception as e:
-            logging.error(f"❌ Ошибка при форматировании позиции: {e}")
-            return "📂 Нет открытых позиций"
-    
-    # Если positions это список (несколько позиций)
-    elif isinstance(positions, list):
-        for pos in positions:
-            try:
-                # Безопасное получение значений с преобразованием типов
-                symbol = pos.get('symbol', 'Unknown')
-                side = pos.get('side', 'Unknown')
-                qty = float(pos.get('size', 0))
-                entry = float(pos.get('avgPrice', 0))
-                leverage = int(pos.get('leverage', 1))
-                unrealized_pnl = float(pos.get('unrealisedPnl', 0))
-                stop_loss = float(pos.get('stopLoss', 0))
-                take_profit_1 = float(pos.get('takeProfit1', 0))
-                take_profit_2 = float(pos.get('takeProfit2', 0))
-                take_profit_3 = float(pos.get('takeProfit3', 0))
-                
-                # Пропускаем пустые позиции
-                if qty == 0 or not side:
-                    logging.warning(f"⚠️ Пропущена пустая позиция: {pos}")
-                    continue
-                
-                message += f"🔹 {symbol}: {side} {qty} @ {entry:.2f} (x{leverage})\n"
-                message += f"   📊 PnL: {unrealized_pnl:.2f} USDT\n"
-                message += f"   🛑 Стоп-лосс: {stop_loss:.2f}\n"
-                message += f"   🎯 Тейк-профиты:\n"
-                message += f"      TP1: {take_profit_1:.2f}\n"
-                message += f"      TP2: {take_profit_2:.2f}\n"
-                message += f"      TP3: {take_profit_3:.2f}\n"
-                
-                # Добавляем информацию о трейлинг-стопе
-                if pos.get('trailing_stop'):
-                    message += f"   📈 Трейлинг-стоп: {pos['trailing_stop']:.2f}\n"
-                
-                # Добавляем информацию о частичном закрытии
-                if pos.get('partial_closes'):
-                    message += f"   🔄 Частичные закрытия:\n"
-                    for close in pos['partial_closes']:
-                        message += f"      {close['size']} @ {close['price']:.2f}\n"
-                
-                message += "\n"  # Добавляем пустую строку между позициями
-                
-            except Exception as e:
-                logging.error(f"❌ Ошибка при форматировании позиции: {e}")
-                continue
-    
+            logger.error("❌ Ошибка при форматировании позиции: %s", e, exc_info=True)
+            continue
+
     return message if message != "📂 Открытые позиции:\n" else "📂 Нет открытых позиций"
 
 def format_pnl(pnl_data: dict) -> str:
@@ -245,57 +281,46 @@ def format_pnl(pnl_data: dict) -> str:
             message += "Последние сделки:\n"
             for trade in trades[:5]:  # ✅ Выводим только последние 5 сделок
                 try:
-                    symbol = trade.get('symbol', 'Unknown')
-                    pnl = float(trade.get('closedPnl', 0))  # 🔥 Преобразуем в float
-                    side = trade.get('side', 'Unknown')
-                    entry_price = float(trade.get('avgEntryPrice', 0))  # 🔥 Добавляем цену входа
-                    exit_price = float(trade.get('avgExitPrice', 0))  # 🔥 Добавляем цену выхода
-
-                    if symbol and pnl is not None:
-                        message += f"🔸 {symbol} ({side}):\n"
-                        message += f"   PnL: {pnl:.2f} USDT\n"
-                        message += f"   Вход: {entry_price:.2f} | Выход: {exit_price:.2f}\n"
-                    else:
-                        logging.warning(f"⚠️ Пропущена сделка с неполными данными: {trade}")
+                    t = msgspec.convert(trade, Trade, strict=False)
+                    message += f"🔸 {t.symbol} ({t.side}):\n"
+                    message += f"   PnL: {t.closedPnl:.2f} USDT\n"
+                    message += f"   Вход: {t.avgEntryPrice:.2f} | Выход: {t.avgExitPrice:.2f}\n"
                 except Exception as e:
-                    logging.error(f"❌ Ошибка при форматировании сделки: {e}")
+                    logger.error("❌ Ошибка при форматировании сделки: %s", e, exc_info=True)
                     continue
         else:
             message += "Нет завершенных сделок"
 
         return message
     except Exception as e:
-        logging.error(f"❌ Ошибка при форматировании PnL: {e}")
+        logger.error("❌ Ошибка при форматировании PnL: %s", e, exc_info=True)
         return "❌ Ошибка при форматировании PnL"
 
+class _DefaultZero(dict):
+    """Словарь, отдающий 0.0 для отсутствующих индикаторов — позволяет
+    форматировать весь шаблон одним вызовом без предварительных проверок"""
+    def __missing__(self, key):
+        return 0.0
+
+# Единый шаблон вместо девяти конкатенаций f-строк
+_IND_TMPL = (
+    "📊 Текущие индикаторы:\n\n"
+    "💰 Цена: {last_close:.2f}\n"
+    "📈 VWAP: {VWAP:.2f}\n"
+    "📊 RSI: {RSI:.2f}\n"
+    "📏 ATR: {ATR:.2f}\n"
+    "📉 SMA20: {SMA20:.2f}\n"
+    "📉 SMA50: {SMA50:.2f}\n"
+    "🛑 Поддержка: {support:.2f}\n"
+    "🎯 Сопротивление: {resistance:.2f}"
+)
+
 def format_indicators(indicators: dict) -> str:
     """Форматирует индикаторы в читаемый текст"""
     try:
-        message = "📊 Текущие индикаторы:\n\n"
-        
-        # Цена и VWAP
-        message += f"💰 Цена: {indicators['last_close']:.2f}\n"
-        message += f"📈 VWAP: {indicators['VWAP']:.2f}\n"
-        
-        # RSI
-        message += f"📊 RSI: {indicators['RSI']:.2f}\n"
-        
-        # ATR
-        message += f"📏 ATR: {indicators['ATR']:.2f}\n"
-        
-        # SMA
-        message += f"📉 SMA20: {indicators['SMA20']:.2f}\n"
-        message += f"📉 SMA50: {indicators['SMA50']:.2f}\n"
-        
-        # Поддержка и сопротивление
-        if indicators.get('support'):
-            message += f"🛑 Поддержка: {indicators['support']:.2f}\n"
-        if indicators.get('resistance'):
-            message += f"🎯 Сопротивление: {indicators['resistance']:.2f}\n"
-        
-        return message
+        return _IND_TMPL.format_map(_DefaultZero(indicators))
     except Exception as e:
-        logging.error(f"❌ Ошибка при форматировании индикаторов: {e}")
+        logger.error("❌ Ошибка при форматировании индикаторов: %s", e, exc_info=True)
         return "❌ Ошибка при форматировании индикаторов"
 
 def get_main_keyboard():
@@ -325,7 +350,7 @@ async def open_positions_handler(callback: types.CallbackQuery):
             
         await callback.message.answer(message)
     except Exception as e:
-        logging.error(f"❌ Ошибка при получении позиций: {e}")
+        logger.error("❌ Ошибка при получении позиций: %s", e, exc_info=True)
         await callback.message.answer("❌ Ошибка при получении позиций")
     finally:
         await callback.answer()
@@ -341,86 +366,166 @@ async def pnl_info_handler(callback: types.CallbackQuery):
             
         await callback.message.answer(message)
     except Exception as e:
-        logging.error(f"❌ Ошибка при получении PnL: {e}")
+        logger.error("❌ Ошибка при получении PnL: %s", e, exc_info=True)
         await callback.message.answer("❌ Ошибка при получении PnL")
     finally:
         await callback.answer()
 
+class OutgoingScheduler:
+    """Исходящая очередь Telegram: токен-бакет под лимит 30 msg/s и
+    коалесценция повторных edit'ов — при спаме кнопкой до API доезжает
+    только последняя версия текста для каждого (chat, message)"""
+
+    def __init__(self, rate: int = 30):
+        self._rate = rate
+        self._tokens = rate
+        self._refill_at = time.monotonic() + 1.0
+        self._pending: dict[tuple[int, int], asyncio.Task] = {}
+        # Отпечаток последнего доставленного edit'а: повторный тап той же
+        # кнопкой не тратит сообщение из бюджета 30/с и не ловит
+        # MessageNotModified от Telegram
+        self._last_sent: dict[tuple[int, int], int] = {}
+
+    async def _acquire(self):
+        """Ждёт свободный токен, пополняя бакет раз в секунду"""
+        while True:
+            now = time.monotonic()
+            if now >= self._refill_at:
+                self._tokens = self._rate
+                self._refill_at = now + 1.0
+            if self._tokens > 0:
+                self._tokens -= 1
+                return
+            await asyncio.sleep(self._refill_at - now)
+
+    async def edit(self, message: types.Message, text: str, reply_markup=None):
+        """Планирует edit_text, отменяя ещё не отправленный edit того же сообщения"""
+        key = (message.chat.id, message.message_id)
+        fingerprint = hash((
+            text,
+            reply_markup.model_dump_json() if reply_markup is not None else None
+        ))
+        if self._last_sent.get(key) == fingerprint:
+            return
+        prev = self._pending.pop(key, None)
+        if prev is not None and not prev.done():
+            prev.cancel()
+        self._pending[key] = asyncio.create_task(
+            self._send_edit(key, message, text, reply_markup, fingerprint)
+        )
+
+    async def _send_edit(self, key, message, text, reply_markup, fingerprint):
+        try:
+            await self._acquire()
+            await message.edit_text(text, reply_markup=reply_markup)
+            self._last_sent[key] = fingerprint
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error("❌ Ошибка при редактировании сообщения: %s", e, exc_info=True)
+        finally:
+            if self._pending.get(key) is asyncio.current_task():
+                self._pending.pop(key, None)
+
+scheduler = OutgoingScheduler()
+
+# Дебаунс обновления: параллельные нажатия сливаются в один апдейт,
+# а повторное нажатие сразу после успешного — отвечает из кэша
+_refresh_lock = asyncio.Lock()
+_last_refresh: float = 0.0
+_REFRESH_MIN_INTERVAL = 5.0
+
 @dp.callback_query(F.data == "refresh_data")
 async def refresh_data_callback(callback: types.CallbackQuery):
     """Обработчик обновления всех JSON файлов"""
+    global _last_refresh
+    now = time.monotonic()
+    if now - _last_refresh < _REFRESH_MIN_INTERVAL:
+        return await callback.answer("⏳ Данные только что обновлены", show_alert=False)
+
     try:
         await callback.answer("🔄 Начинаем обновление данных...")
-        
-        # Обновляем баланс
-        balance_info = await bot.api.get_wallet_balance(accountType="UNIFIED")
-        if balance_info and "result" in balance_info and "list" in balance_info["result"]:
-            wallet = balance_info["result"]["list"][0]
-            balance_data = {
-                "balance": float(wallet.get("totalWalletBalance", 0)),
-                "equity": float(wallet.get("totalEquity", 0)),
-                "unrealized_pnl": float(wallet.get("totalUnrealizedPnl", 0)),
-                "used_margin": float(wallet.get("totalUsedMargin", 0)),
-                "free_margin": float(wallet.get("totalAvailableBalance", 0)),
-                "last_updated": datetime.now().isoformat()
-            }
-            update_json_file("balance.json", balance_data)
-            logging.info("✅ balance.json обновлен")
-
-        # Обновляем позиции
-        positions = await bot.api.get_positions(category="linear", symbol=SYMBOL)
-        if positions and positions.get("result", {}).get("list"):
-            positions_data = {"positions": positions["result"]["list"], "last_updated": datetime.now().isoformat()}
-            update_json_file("positions.json", positions_data)
-            logging.info("✅ positions.json обновлен")
-
-        # Обновляем PnL
-        pnl = await bot.api.get_closed_pnl(category="linear", symbol=SYMBOL)
-        if pnl and pnl.get("result", {}).get("list"):
-            pnl_data = {
-                "trades": pnl["result"]["list"],
-                "daily_pnl": sum(float(trade["closedPnl"]) for trade in pnl["result"]["list"]),
-                "last_updated": datetime.now().isoformat()
-            }
-            update_json_file("pnl.json", pnl_data)
-            logging.info("✅ pnl.json обновлен")
-
-        # Обновляем цену
-        price = await bot.api.get_latest_price()
-        if price:
-            price_data = {"price": price, "last_updated": datetime.now().isoformat()}
-            update_json_file("price.json", price_data)
-            logging.info("✅ price.json обновлен")
-
-        # Обновляем индикаторы
-        indicators = await bot.calculate_indicators()
-        if indicators:
-            indicators["last_updated"] = datetime.now().isoformat()
-            update_json_file("indicators.json", indicators)
-            logging.info("✅ indicators.json обновлен")
-
-        # Обновляем сигналы
-        signals_data = {
-            "refresh_data": False,
-            "last_updated": datetime.now().isoformat()
-        }
-        update_json_file("signals.json", signals_data)
-        logging.info("✅ signals.json обновлен")
+        async with _refresh_lock:
+            # Пока ждали блокировку, другой обработчик мог уже всё обновить
+            if time.monotonic() - _last_refresh < _REFRESH_MIN_INTERVAL:
+                return
+            await _do_refresh(callback)
+            _last_refresh = time.monotonic()
 
-        await callback.message.edit_text(
-            "✅ Все данные успешно обновлены!\n"
-            "Последнее обновление: " + datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            reply_markup=get_main_keyboard()
-        )
-        
     except Exception as e:
         error_msg = f"❌ Ошибка при обновлении данных: {str(e)}"
-        logging.error(error_msg)
-        await callback.message.edit_text(
+        logger.error("❌ Ошибка при обновлении данных: %s", e, exc_info=True)
+        await scheduler.edit(
+            callback.message,
             error_msg,
             reply_markup=get_main_keyboard()
         )
 
+async def _do_refresh(callback: types.CallbackQuery):
+    """Собственно обновление всех файлов состояния"""
+    
+    # Обновляем баланс
+    balance_info = await bot.api.get_wallet_balance(accountType="UNIFIED")
+    if balance_info and "result" in balance_info and "list" in balance_info["result"]:
+        wallet = balance_info["result"]["list"][0]
+        balance_data = {
+            "balance": float(wallet.get("totalWalletBalance", 0)),
+            "equity": float(wallet.get("totalEquity", 0)),
+            "unrealized_pnl": float(wallet.get("totalUnrealizedPnl", 0)),
+            "used_margin": float(wallet.get("totalUsedMargin", 0)),
+            "free_margin": float(wallet.get("totalAvailableBalance", 0)),
+            "last_updated": datetime.now().isoformat()
+        }
+        update_json_file("balance.json", balance_data)
+        logger.info("✅ balance.json обновлен")
+
+    # Обновляем позиции
+    positions = await bot.api.get_positions(category="linear", symbol=SYMBOL)
+    if positions and positions.get("result", {}).get("list"):
+        positions_data = {"positions": positions["result"]["list"], "last_updated": datetime.now().isoformat()}
+        update_json_file("positions.json", positions_data)
+        logger.info("✅ positions.json обновлен")
+
+    # Обновляем PnL
+    pnl = await bot.api.get_closed_pnl(category="linear", symbol=SYMBOL)
+    if pnl and pnl.get("result", {}).get("list"):
+        pnl_data = {
+            "trades": pnl["result"]["list"],
+            "daily_pnl": sum(float(trade["closedPnl"]) for trade in pnl["result"]["list"]),
+            "last_updated": datetime.now().isoformat()
+        }
+        update_json_file("pnl.json", pnl_data)
+        logger.info("✅ pnl.json обновлен")
+
+    # Обновляем цену
+    price = await bot.api.get_latest_price()
+    if price:
+        price_data = {"price": price, "last_updated": datetime.now().isoformat()}
+        update_json_file("price.json", price_data)
+        logger.info("✅ price.json обновлен")
+
+    # Обновляем индикаторы
+    indicators = await bot.calculate_indicators()
+    if indicators:
+        indicators["last_updated"] = datetime.now().isoformat()
+        update_json_file("indicators.json", indicators)
+        logger.info("✅ indicators.json обновлен")
+
+    # Обновляем сигналы
+    signals_data = {
+        "refresh_data": False,
+        "last_updated": datetime.now().isoformat()
+    }
+    update_json_file("signals.json", signals_data)
+    logger.info("✅ signals.json обновлен")
+
+    await scheduler.edit(
+        callback.message,
+        "✅ Все данные успешно обновлены!\n"
+        "Последнее обновление: " + datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        reply_markup=get_main_keyboard()
+    )
+
 @dp.message(CommandStart())
 async def send_welcome(message: types.Message):
     """Обработчик команды /start"""
@@ -429,12 +534,6 @@ async def send_welcome(message: types.Message):
         reply_markup=commands_keyboard
     )
 
-@dp.message(F.text == "📊 Статус")
-async def status_handler(message: types.Message):
-    """Обработчик кнопки статуса"""
-    await check_status(message)
-
-@dp.message(F.text == "📂 Позиции")
 async def positions_handler(message: types.Message):
     """Обработчик кнопки позиций"""
     try:
@@ -446,10 +545,9 @@ async def positions_handler(message: types.Message):
             
         await message.answer(message_text)
     except Exception as e:
-        logging.error(f"❌ Ошибка при получении позиций: {e}")
+        logger.error("❌ Ошибка при получении позиций: %s", e, exc_info=True)
         await message.answer("❌ Ошибка при получении позиций")
 
-@dp.message(F.text == "💰 PnL")
 async def pnl_handler(message: types.Message):
     """Обработчик кнопки PnL"""
     try:
@@ -460,10 +558,9 @@ async def pnl_handler(message: types.Message):
             
         await message.answer(message_text)
     except Exception as e:
-        logging.error(f"❌ Ошибка при получении PnL: {e}")
+        logger.error("❌ Ошибка при получении PnL: %s", e, exc_info=True)
         await message.answer("❌ Ошибка при получении PnL")
 
-@dp.message(F.text == "📊 Индикаторы")
 async def indicators_handler(message: types.Message):
     """Обработчик кнопки индикаторов"""
     try:
@@ -474,10 +571,9 @@ async def indicators_handler(message: types.Message):
             
         await message.answer(message_text)
     except Exception as e:
-        logging.error(f"❌ Ошибка при получении индикаторов: {e}")
+        logger.error("❌ Ошибка при получении индикаторов: %s", e, exc_info=True)
         await message.answer("❌ Ошибка при получении индикаторов")
 
-@dp.message(F.text == "🔄 Обновить")
 async def refresh_handler(message: types.Message):
     """Обработчик кнопки обновления"""
     try:
@@ -487,80 +583,59 @@ async def refresh_handler(message: types.Message):
         else:
             await message.answer("❌ Ошибка при отправке запроса на обновление")
     except Exception as e:
-        logging.error(f"❌ Ошибка при обновлении данных: {e}")
+        logger.error("❌ Ошибка при обновлении данных: %s", e, exc_info=True)
         await message.answer("❌ Ошибка при обновлении данных")
 
-@dp.message(F.text == "🛒 Купить")
-async def buy_handler(message: types.Message):
-    """Обработчик кнопки покупки"""
+async def _place_signal(message: types.Message, side: str):
+    """Общая логика кнопок покупки/продажи: проверка индикаторов и запись сигнала"""
     try:
         # Получаем текущие индикаторы
         indicators = read_json_file('indicators.json')
         if not indicators:
             await message.answer("❌ Нет данных индикаторов. Нажмите /Обновить и попробуйте снова.")
             return
-            
-        # Проверяем условия для входа
-        if indicators.get('RSI', 0) > 65:
-            await message.answer("❌ RSI слишком высокий (>65). Не рекомендуется входить в длинную позицию.")
-            return
-            
-        if indicators.get('last_close', 0) < indicators.get('VWAP', 0):
-            await message.answer("❌ Цена ниже VWAP. Не рекомендуется входить в длинную позицию.")
-            return
-            
-        # Создаем сигнал на покупку
+
+        # Проверяем условия для входа (для Buy и Sell условия зеркальные)
+        if side == "Buy":
+            if indicators.get('RSI', 0) > 65:
+                await message.answer("❌ RSI слишком высокий (>65). Не рекомендуется входить в длинную позицию.")
+                return
+            if indicators.get('last_close', 0) < indicators.get('VWAP', 0):
+                await message.answer("❌ Цена ниже VWAP. Не рекомендуется входить в длинную позицию.")
+                return
+        else:
+            if indicators.get('RSI', 0) < 35:
+                await message.answer("❌ RSI слишком низкий (<35). Не рекомендуется входить в короткую позицию.")
+                return
+            if indicators.get('last_close', 0) > indicators.get('VWAP', 0):
+                await message.answer("❌ Цена выше VWAP. Не рекомендуется входить в короткую позицию.")
+                return
+
+        # Создаем сигнал
         signal_data = {
             "force_trade": True,
-            "side": "Buy",
+            "side": side,
             "price": indicators['last_close'],
             "last_signal": datetime.now().isoformat()
         }
-        
+
+        action = "покупку" if side == "Buy" else "продажу"
         if write_json_file('signals.json', signal_data):
-            await message.answer(f"✅ Сигнал на покупку отправлен по цене {indicators['last_close']:.2f}")
+            await message.answer(f"✅ Сигнал на {action} отправлен по цене {indicators['last_close']:.2f}")
         else:
             await message.answer("❌ Ошибка при отправке сигнала")
-            
+
     except Exception as e:
-        logging.error(f"❌ Ошибка при обработке сигнала покупки: {e}")
+        logger.error("❌ Ошибка при обработке сигнала (%s): %s", side, e)
         await message.answer("❌ Произошла ошибка при обработке сигнала")
 
-@dp.message(F.text == "📉 Продать")
+async def buy_handler(message: types.Message):
+    """Обработчик кнопки покупки"""
+    await _place_signal(message, "Buy")
+
 async def sell_handler(message: types.Message):
     """Обработчик кнопки продажи"""
-    try:
-        # Получаем текущие индикаторы
-        indicators = read_json_file('indicators.json')
-        if not indicators:
-            await message.answer("❌ Нет данных индикаторов. Нажмите /Обновить и попробуйте снова.")
-            return
-            
-        # Проверяем условия для входа
-        if indicators.get('RSI', 0) < 35:
-            await message.answer("❌ RSI слишком низкий (<35). Не рекомендуется входить в короткую позицию.")
-            return
-            
-        if indicators.get('last_close', 0) > indicators.get('VWAP', 0):
-            await message.answer("❌ Цена выше VWAP. Не рекомендуется входить в короткую позицию.")
-            return
-            
-        # Создаем сигнал на продажу
-        signal_data = {
-            "force_trade": True,
-            "side": "Sell",
-            "price": indicators['last_close'],
-            "last_signal": datetime.now().isoformat()
-        }
-        
-        if write_json_file('signals.json', signal_data):
-            await message.answer(f"✅ Сигнал на продажу отправлен по цене {indicators['last_close']:.2f}")
-        else:
-            await message.answer("❌ Ошибка при отправке сигнала")
-            
-    except Exception as e:
-        logging.error(f"❌ Ошибка при обработке сигнала продажи: {e}")
-        await message.answer("❌ Произошла ошибка при обработке сигнала")
+    await _place_signal(message, "Sell")
 
 @dp.message(Command("status"))
 async def check_status(message: types.Message):
@@ -585,12 +660,33 @@ async def check_status(message: types.Message):
         """
         await message.answer(status_message)
     except Exception as e:
-        logging.error(f"❌ Ошибка при проверке статуса: {e}")
+        logger.error("❌ Ошибка при проверке статуса: %s", e, exc_info=True)
         await message.answer("❌ Ошибка при проверке статуса")
 
-@dp.message(Command("buy"))
-async def force_buy(message: types.Message):
-    """Принудительное открытие длинной позиции"""
+# 📌 Таблица диспетчеризации кнопок: один хэш-поиск вместо линейного
+# перебора отдельных фильтров F.text == "..." на каждое сообщение
+_TEXT_HANDLERS = {
+    "📊 Статус": check_status,
+    "📂 Позиции": positions_handler,
+    "💰 PnL": pnl_handler,
+    "📊 Индикаторы": indicators_handler,
+    "🔄 Обновить": refresh_handler,
+    "🛒 Купить": buy_handler,
+    "📉 Продать": sell_handler,
+}
+
+@dp.message(F.text.in_(set(_TEXT_HANDLERS)))
+async def text_button_dispatcher(message: types.Message):
+    """Единый обработчик текстовых кнопок с O(1) маршрутизацией по словарю"""
+    await _TEXT_HANDLERS[message.text](message)
+
+# Множители SL/TP1/TP2/TP3 относительно текущей цены — единственное
+# место, где живут эти магические числа
+_BUY_MULTS = (0.995, 1.005, 1.01, 1.015)
+_SELL_MULTS = (1.005, 0.995, 0.99, 0.985)
+
+async def _force_signal(message: types.Message, side: str, mults: tuple):
+    """Общая логика принудительного открытия позиции по текущей цене"""
     try:
         price_data = read_json_file('price.json')
         current_price = float(price_data.get('price', 0))
@@ -599,14 +695,13 @@ async def force_buy(message: types.Message):
             await message.answer("❌ Ошибка: нет данных о цене, попробуйте обновить данные.")
             return
 
-        stop_loss = current_price * 0.995
-        take_profit_1 = current_price * 1.005
-        take_profit_2 = current_price * 1.01
-        take_profit_3 = current_price * 1.015
+        stop_loss, take_profit_1, take_profit_2, take_profit_3 = (
+            current_price * m for m in mults
+        )
 
         signal = {
             "force_trade": True,
-            "side": "Buy",
+            "side": side,
             "price": current_price,
             "stop_loss": stop_loss,
             "take_profit_1": take_profit_1,
@@ -615,117 +710,184 @@ async def force_buy(message: types.Message):
             "qty": 0.001
         }
 
+        action = "покупку" if side == "Buy" else "продажу"
         if write_json_file('signals.json', signal):
-            await message.answer(f"✅ Сигнал на покупку отправлен: {current_price:.2f}")
+            await message.answer(f"✅ Сигнал на {action} отправлен: {current_price:.2f}")
         else:
             await message.answer("❌ Ошибка при отправке сигнала")
 
     except Exception as e:
-        logging.error(f"❌ Ошибка при открытии сделки: {e}")
+        logger.error("❌ Ошибка при открытии сделки: %s", e, exc_info=True)
         await message.answer("❌ Ошибка при открытии сделки")
 
+@dp.message(Command("buy"))
+async def force_buy(message: types.Message):
+    """Принудительное открытие длинной позиции"""
+    await _force_signal(message, "Buy", _BUY_MULTS)
+
 @dp.message(Command("sell"))
 async def force_sell(message: types.Message):
     """Принудительное открытие короткой позиции"""
-    try:
-        price_data = read_json_file('price.json')
-        current_price = float(price_data.get('price', 0))
-
-        if current_price <= 0:
-            await message.answer("❌ Ошибка: нет данных о цене, попробуйте обновить данные.")
-            return
-
-        stop_loss = current_price * 1.005
-        take_profit_1 = current_price * 0.995
-        take_profit_2 = current_price * 0.99
-        take_profit_3 = current_price * 0.985
-
-        signal = {
-            "force_trade": True,
-            "side": "Sell",
-            "price": current_price,
-            "stop_loss": stop_loss,
-            "take_profit_1": take_profit_1,
-            "take_profit_2": take_profit_2,
-            "take_profit_3": take_profit_3,
-            "qty": 0.001
+    await _force_signal(message, "Sell", _SELL_MULTS)
+
+# Кэш индикаторов: при шквале одинаковых нажатий пересчитывать ATR/RSI на
+# каждый callback бессмысленно — свеча та же; держим последний результат
+# пару секунд, а сам расчёт уводим в поток, чтобы не блокировать event loop
+_ind_cache = {"t": 0.0, "v": None}
+
+# Индекс позиций по символу: строим словарь один раз в пару секунд и дальше
+# ищем позицию за O(1) вместо линейного перебора списка на каждый callback
+_pos_cache = {"t": 0.0, "v": {}}
+
+# Кэшированная ссылка на торговый бот: цепочка bot.trading_bot — это два
+# словарных поиска на каждое обращение, резолвим её один раз при первом вызове
+_trading_bot = None
+
+def _tb():
+    """Возвращает торговый бот одним LOAD_GLOBAL вместо цепочки атрибутов"""
+    global _trading_bot
+    if _trading_bot is None:
+        _trading_bot = bot.trading_bot
+    return _trading_bot
+
+async def positions_by_symbol(ttl: float = 2.0) -> dict:
+    """Возвращает свежий словарь {symbol: Position} с коротким TTL"""
+    now = time.monotonic()
+    if now - _pos_cache["t"] > ttl:
+        positions = await asyncio.to_thread(_tb().get_positions)
+        # Конвертируем в слотовые Struct один раз при обновлении кэша:
+        # дальше обработчики читают атрибуты без хэш-поиска по словарю
+        _pos_cache["v"] = {
+            p.symbol: p
+            for p in (msgspec.convert(raw, Position, strict=False) for raw in positions)
         }
-
-        if write_json_file('signals.json', signal):
-            await message.answer(f"✅ Сигнал на продажу отправлен: {current_price:.2f}")
-        else:
-            await message.answer("❌ Ошибка при отправке сигнала")
-
-    except Exception as e:
-        logging.error(f"❌ Ошибка при открытии сделки: {e}")
-        await message.answer("❌ Ошибка при открытии сделки")
+        _pos_cache["t"] = now
+    return _pos_cache["v"]
+
+async def cached_indicators(ttl: float = 1.5):
+    """Возвращает индикаторы с коротким TTL, считая их вне event loop"""
+    now = time.monotonic()
+    if _ind_cache["v"] is None or now - _ind_cache["t"] > ttl:
+        _ind_cache["v"] = await asyncio.to_thread(_tb().calculate_indicators)
+        _ind_cache["t"] = now
+    return _ind_cache["v"]
+
+# Типизированные фабрики callback-данных: роутер aiogram матчит их по
+# точному префиксу (хэш вместо цепочки startswith) и сам разбирает поля —
+# в обработчиках больше нет split('_') и индексной арифметики
+class RSIPeriodCB(CallbackData, prefix="set_rsi"):
+    period: int
+
+class ATRPeriodCB(CallbackData, prefix="set_atr"):
+    period: int
+
+class SMAPeriodCB(CallbackData, prefix="set_sma"):
+    period: int
+
+class PositionSizeCB(CallbackData, prefix="pos_size"):
+    size: float
+
+class SLMultCB(CallbackData, prefix="cfg_sl"):
+    mult: float
+
+class NotifyCB(CallbackData, prefix="notify"):
+    enabled: bool
+
+# Раздельные префиксы для TP-меню: раньше startswith('set_tp') перехватывал
+# и set_tp_multiplier_*, из-за чего множитель уезжал не в тот обработчик
+class TPSelectCB(CallbackData, prefix="tpsel"):
+    tp_num: int
+
+class TPMultCB(CallbackData, prefix="tpmult"):
+    tp_num: int
+    mult: float
+
+class SetTPCB(CallbackData, prefix="settp"):
+    symbol: str
+    tp_num: int
+    mult: float
+
+# ATR-множители для меню выбора: единственное место, где живут эти ряды
+TP_MULTS = (1.0, 1.5, 2.0, 2.5)
+SL_MULTS = (0.5, 1.0, 1.5, 2.0)
+
+# Имена TP-атрибутов по номеру: индекс в кортеж вместо сборки f-строки
+# на каждое нажатие (нулевой слот — чтобы индексировать напрямую 1..3)
+TP_KEYS = (None, 'takeProfit1', 'takeProfit2', 'takeProfit3')
+
+# Ожидаемая арность оставшихся строковых callback-данных: форму проверяем
+# заранее одним сравнением, чтобы кривые данные не доезжали до ValueError
+# с построением и логированием трейсбека
+_CB_ARITY = {
+    'sl': 2,      # sl_{symbol}
+    'set_sl': 4,  # set_sl_{symbol}_{mult}
+    'tp': 2,      # tp{N}_{symbol}
+}
+
+def _split_cb(data: str, kind: str):
+    """Разбивает callback.data и сверяет арность; None — данные битые"""
+    parts = data.split('_')
+    return parts if len(parts) == _CB_ARITY[kind] else None
 
 @dp.callback_query(F.data.startswith('sl_'))
 async def stop_loss_callback(callback: types.CallbackQuery):
     """Обработчик callback-запросов для стоп-лосса"""
     try:
-        symbol = callback.data.split('_')[1]
-        positions = bot.trading_bot.get_positions()
-        
-        # Находим позицию по символу
-        position = None
-        for pos in positions:
-            if pos.get('symbol') == symbol:
-                position = pos
-                break
-                
-        if not position:
-            await callback.answer("❌ Позиция не найдена")
-            return
-            
-        # Получаем текущий ATR
-        indicators = bot.trading_bot.calculate_indicators()
+        parts = _split_cb(callback.data, 'sl')
+        if parts is None:
+            return await callback.answer("❌ Некорректные данные кнопки")
+        symbol = parts[1]
+
+        # Сначала самая дешёвая проверка: индикаторы почти всегда из кэша
+        indicators = await cached_indicators()
         if not indicators:
-            await callback.answer("❌ Не удалось получить ATR")
-            return
-            
+            return await callback.answer("❌ Не удалось получить ATR")
+
+        # Находим позицию по символу за один поиск в словаре
+        position = (await positions_by_symbol()).get(symbol)
+        if not position:
+            return await callback.answer("❌ Позиция не найдена")
+
         atr = indicators['ATR']
         current_price = indicators['last_close']
-        current_sl = float(position.get('stopLoss', 0))
-        
-        # Создаем клавиатуру с вариантами стоп-лосса
-        keyboard = types.InlineKeyboardMarkup()
-        keyboard.add(types.InlineKeyboardButton(
-            f"0.5 ATR ({current_price - 0.5 * atr:.2f})",
-            callback_data=f"set_sl_{symbol}_0.5"
-        ))
-        keyboard.add(types.InlineKeyboardButton(
-            f"1.0 ATR ({current_price - atr:.2f})",
-            callback_data=f"set_sl_{symbol}_1.0"
-        ))
-        keyboard.add(types.InlineKeyboardButton(
-            f"1.5 ATR ({current_price - 1.5 * atr:.2f})",
-            callback_data=f"set_sl_{symbol}_1.5"
-        ))
-        keyboard.add(types.InlineKeyboardButton(
-            f"2.0 ATR ({current_price - 2.0 * atr:.2f})",
-            callback_data=f"set_sl_{symbol}_2.0"
-        ))
+        current_sl = position.stopLoss
         
-        await callback.message.edit_text(
+        # Создаем клавиатуру с вариантами стоп-лосса: билдер собирает кнопки
+        # одним списком, adjust(2) даёт компактную сетку и меньше байт в edit
+        # Префикс собираем один раз: в цикле остаётся только конкатенация
+        prefix = f"set_sl_{symbol}_"
+        kb = InlineKeyboardBuilder()
+        for m in SL_MULTS:
+            kb.button(
+                text=f"{m} ATR ({current_price - m * atr:.2f})",
+                callback_data=prefix + str(m)
+            )
+        kb.adjust(2)
+        keyboard = kb.as_markup()
+
+        await scheduler.edit(
+            callback.message,
             f"🛑 Выберите новый стоп-лосс для {symbol}:\n"
             f"Текущий SL: {current_sl:.2f}\n"
             f"ATR: {atr:.2f}",
             reply_markup=keyboard
         )
     except Exception as e:
-        logging.error(f"❌ Ошибка в stop_loss_callback: {e}")
+        logger.error("❌ Ошибка в stop_loss_callback: %s", e, exc_info=True)
         await callback.answer("❌ Произошла ошибка")
 
 @dp.callback_query(F.data.startswith('set_sl_'))
 async def set_stop_loss_callback(callback: types.CallbackQuery):
     """Обработчик callback-запросов для установки стоп-лосса"""
     try:
-        _, _, symbol, atr_multiplier = callback.data.split('_')
+        parts = _split_cb(callback.data, 'set_sl')
+        if parts is None:
+            return await callback.answer("❌ Некорректные данные кнопки")
+        _, _, symbol, atr_multiplier = parts
         atr_multiplier = float(atr_multiplier)
         
         # Получаем текущие индикаторы
-        indicators = bot.trading_bot.calculate_indicators()
+        indicators = await cached_indicators()
         if not indicators:
             await callback.answer("❌ Не удалось получить ATR")
             return
@@ -740,7 +902,7 @@ async def set_stop_loss_callback(callback: types.CallbackQuery):
             new_sl = current_price + atr_multiplier * atr
             
         # Устанавливаем новый стоп-лосс
-        success = bot.trading_bot.set_stop_loss(symbol, new_sl)
+        success = await asyncio.to_thread(_tb().set_stop_loss, symbol, new_sl)
         
         if success:
             await callback.answer(f"✅ Стоп-лосс установлен на {new_sl:.2f}")
@@ -748,75 +910,64 @@ async def set_stop_loss_callback(callback: types.CallbackQuery):
             await callback.answer("❌ Не удалось установить стоп-лосс")
             
     except Exception as e:
-        logging.error(f"❌ Ошибка в set_stop_loss_callback: {e}")
+        logger.error("❌ Ошибка в set_stop_loss_callback: %s", e, exc_info=True)
         await callback.answer("❌ Произошла ошибка")
 
-@dp.callback_query(F.data.startswith('tp'))
+@dp.callback_query(F.data.regexp(r'^tp[123]_'))
 async def take_profit_callback(callback: types.CallbackQuery):
     """Обработчик callback-запросов для тейк-профита"""
     try:
-        tp_type, symbol = callback.data.split('_')
-        positions = bot.trading_bot.get_positions()
-        
-        # Находим позицию по символу
-        position = None
-        for pos in positions:
-            if pos.get('symbol') == symbol:
-                position = pos
-                break
-                
-        if not position:
-            await callback.answer("❌ Позиция не найдена")
-            return
-            
-        # Получаем текущий ATR
-        indicators = bot.trading_bot.calculate_indicators()
+        parts = _split_cb(callback.data, 'tp')
+        if parts is None:
+            return await callback.answer("❌ Некорректные данные кнопки")
+        tp_type, symbol = parts
+        tp_num = int(tp_type[2])
+
+        # Сначала самая дешёвая проверка: индикаторы почти всегда из кэша
+        indicators = await cached_indicators()
         if not indicators:
-            await callback.answer("❌ Не удалось получить ATR")
-            return
-            
+            return await callback.answer("❌ Не удалось получить ATR")
+
+        # Находим позицию по символу за один поиск в словаре
+        position = (await positions_by_symbol()).get(symbol)
+        if not position:
+            return await callback.answer("❌ Позиция не найдена")
+
         atr = indicators['ATR']
         current_price = indicators['last_close']
-        current_tp = float(position.get(f'takeProfit{tp_type[2]}', 0))
-        
+        current_tp = getattr(position, TP_KEYS[tp_num], 0.0)
+
         # Создаем клавиатуру с вариантами тейк-профита
-        keyboard = types.InlineKeyboardMarkup()
-        keyboard.add(types.InlineKeyboardButton(
-            f"1.0 ATR ({current_price + atr:.2f})",
-            callback_data=f"set_tp_{symbol}_{tp_type[2]}_1.0"
-        ))
-        keyboard.add(types.InlineKeyboardButton(
-            f"1.5 ATR ({current_price + 1.5 * atr:.2f})",
-            callback_data=f"set_tp_{symbol}_{tp_type[2]}_1.5"
-        ))
-        keyboard.add(types.InlineKeyboardButton(
-            f"2.0 ATR ({current_price + 2.0 * atr:.2f})",
-            callback_data=f"set_tp_{symbol}_{tp_type[2]}_2.0"
-        ))
-        keyboard.add(types.InlineKeyboardButton(
-            f"2.5 ATR ({current_price + 2.5 * atr:.2f})",
-            callback_data=f"set_tp_{symbol}_{tp_type[2]}_2.5"
-        ))
-        
-        await callback.message.edit_text(
-            f"🎯 Выберите новый тейк-профит {tp_type[2]} для {symbol}:\n"
-            f"Текущий TP{tp_type[2]}: {current_tp:.2f}\n"
+        kb = InlineKeyboardBuilder()
+        for m in TP_MULTS:
+            kb.button(
+                text=f"{m} ATR ({current_price + m * atr:.2f})",
+                callback_data=SetTPCB(symbol=symbol, tp_num=tp_num, mult=m)
+            )
+        kb.adjust(2)
+        keyboard = kb.as_markup()
+
+        await scheduler.edit(
+            callback.message,
+            f"🎯 Выберите новый тейк-профит {tp_num} для {symbol}:\n"
+            f"Текущий TP{tp_num}: {current_tp:.2f}\n"
             f"ATR: {atr:.2f}",
             reply_markup=keyboard
         )
     except Exception as e:
-        logging.error(f"❌ Ошибка в take_profit_callback: {e}")
+        logger.error("❌ Ошибка в take_profit_callback: %s", e, exc_info=True)
         await callback.answer("❌ Произошла ошибка")
 
-@dp.callback_query(F.data.startswith('set_tp_'))
-async def set_take_profit_callback(callback: types.CallbackQuery):
+@dp.callback_query(SetTPCB.filter())
+async def set_take_profit_callback(callback: types.CallbackQuery, callback_data: SetTPCB):
     """Обработчик callback-запросов для установки тейк-профита"""
     try:
-        _, _, symbol, tp_number, atr_multiplier = callback.data.split('_')
-        atr_multiplier = float(atr_multiplier)
-        
+        symbol = callback_data.symbol
+        tp_number = callback_data.tp_num
+        atr_multiplier = callback_data.mult
+
         # Получаем текущие индикаторы
-        indicators = bot.trading_bot.calculate_indicators()
+        indicators = await cached_indicators()
         if not indicators:
             await callback.answer("❌ Не удалось получить ATR")
             return
@@ -831,7 +982,7 @@ async def set_take_profit_callback(callback: types.CallbackQuery):
             new_tp = current_price - atr_multiplier * atr
             
         # Устанавливаем новый тейк-профит
-        success = bot.trading_bot.set_take_profit(symbol, tp_number, new_tp)
+        success = await asyncio.to_thread(_tb().set_take_profit, symbol, tp_number, new_tp)
         
         if success:
             await callback.answer(f"✅ Тейк-профит {tp_number} установлен на {new_tp:.2f}")
@@ -839,275 +990,220 @@ async def set_take_profit_callback(callback: types.CallbackQuery):
             await callback.answer("❌ Не удалось установить тейк-профит")
             
     except Exception as e:
-        logging.error(f"❌ Ошибка в set_take_profit_callback: {e}")
+        logger.error("❌ Ошибка в set_take_profit_callback: %s", e, exc_info=True)
         await callback.answer("❌ Произошла ошибка")
 
-@dp.callback_query(F.data.startswith('settings_'))
+# 📌 Статические инлайн-клавиатуры настроек: кнопки не зависят от состояния,
+# поэтому собираем разметку один раз при импорте, а не на каждое нажатие
+def _inline_kb(*rows):
+    """Собирает InlineKeyboardMarkup из пар (текст, callback_data), по кнопке в ряд"""
+    return types.InlineKeyboardMarkup(inline_keyboard=[
+        [types.InlineKeyboardButton(text=text, callback_data=data)]
+        for text, data in rows
+    ])
+
+NOTIFICATIONS_KB = _inline_kb(
+    ("🔔 Включить уведомления", NotifyCB(enabled=True).pack()),
+    ("🔕 Выключить уведомления", NotifyCB(enabled=False).pack()),
+)
+INDICATORS_KB = _inline_kb(
+    ("📊 Настройка RSI", "settings_rsi"),
+    ("📈 Настройка ATR", "settings_atr"),
+    ("📉 Настройка SMA", "settings_sma"),
+)
+RISK_KB = _inline_kb(
+    ("💰 Размер позиции", "settings_position_size"),
+    ("🛑 Стоп-лосс", "settings_stop_loss"),
+    ("🎯 Тейк-профит", "settings_take_profit"),
+)
+RSI_KB = _inline_kb(*((str(p), RSIPeriodCB(period=p).pack()) for p in (10, 14, 21)))
+ATR_KB = _inline_kb(*((str(p), ATRPeriodCB(period=p).pack()) for p in (10, 14, 21)))
+SMA_KB = _inline_kb(*((f"SMA{p}", SMAPeriodCB(period=p).pack()) for p in (20, 50)))
+POSITION_SIZE_KB = _inline_kb(
+    *((f"{s}%", PositionSizeCB(size=s).pack()) for s in (0.5, 1.0, 2.0, 5.0))
+)
+STOP_LOSS_KB = _inline_kb(
+    *((f"{m} ATR", SLMultCB(mult=m).pack()) for m in (0.5, 1.0, 1.5, 2.0))
+)
+TP_SELECT_KB = _inline_kb(
+    *((f"TP{n}", TPSelectCB(tp_num=n).pack()) for n in (1, 2, 3))
+)
+
+@dp.callback_query(F.data.in_({'settings_notifications', 'settings_indicators', 'settings_risk'}))
 async def settings_callback(callback: types.CallbackQuery):
     """Обработчик callback-запросов для настроек"""
     try:
         setting_type = callback.data.split('_')[1]
-        
+
         if setting_type == 'notifications':
-            keyboard = types.InlineKeyboardMarkup()
-            keyboard.add(types.InlineKeyboardButton(
-                "🔔 Включить уведомления",
-                callback_data="toggle_notifications_on"
-            ))
-            keyboard.add(types.InlineKeyboardButton(
-                "🔕 Выключить уведомления",
-                callback_data="toggle_notifications_off"
-            ))
-            
-            await callback.message.edit_text(
+            await scheduler.edit(
+                callback.message,
                 "🔔 Настройки уведомлений:\n\n"
                 "• Уведомления о входе в позицию\n"
                 "• Уведомления о закрытии позиции\n"
                 "• Уведомления о частичном закрытии\n"
                 "• Уведомления о движении стоп-лосса\n"
                 "• Уведомления об ошибках",
-                reply_markup=keyboard
+                reply_markup=NOTIFICATIONS_KB
             )
-            
+
         elif setting_type == 'indicators':
-            keyboard = types.InlineKeyboardMarkup()
-            keyboard.add(types.InlineKeyboardButton(
-                "📊 Настройка RSI",
-                callback_data="settings_rsi"
-            ))
-            keyboard.add(types.InlineKeyboardButton(
-                "📈 Настройка ATR",
-                callback_data="settings_atr"
-            ))
-            keyboard.add(types.InlineKeyboardButton(
-                "📉 Настройка SMA",
-                callback_data="settings_sma"
-            ))
-            
-            await callback.message.edit_text(
+            await scheduler.edit(
+                callback.message,
                 "📊 Настройки индикаторов:\n\n"
                 "• Период RSI (по умолчанию: 14)\n"
                 "• Период ATR (по умолчанию: 14)\n"
                 "• Периоды SMA (по умолчанию: 20, 50)\n"
                 "• Уровни поддержки и сопротивления",
-                reply_markup=keyboard
+                reply_markup=INDICATORS_KB
             )
-            
+
         elif setting_type == 'risk':
-            keyboard = types.InlineKeyboardMarkup()
-            keyboard.add(types.InlineKeyboardButton(
-                "💰 Размер позиции",
-                callback_data="settings_position_size"
-            ))
-            keyboard.add(types.InlineKeyboardButton(
-                "🛑 Стоп-лосс",
-                callback_data="settings_stop_loss"
-            ))
-            keyboard.add(types.InlineKeyboardButton(
-                "🎯 Тейк-профит",
-                callback_data="settings_take_profit"
-            ))
-            
-            await callback.message.edit_text(
+            await scheduler.edit(
+                callback.message,
                 "💰 Настройки риск-менеджмента:\n\n"
                 "• Размер позиции (% от баланса)\n"
                 "• Множитель стоп-лосса (ATR)\n"
                 "• Множители тейк-профита (ATR)\n"
                 "• Трейлинг-стоп",
-                reply_markup=keyboard
+                reply_markup=RISK_KB
             )
-            
+
     except Exception as e:
-        logging.error(f"❌ Ошибка в settings_callback: {e}")
+        logger.error("❌ Ошибка в settings_callback: %s", e, exc_info=True)
         await callback.answer("❌ Произошла ошибка")
 
-@dp.callback_query(F.data.startswith('toggle_notifications_'))
-async def toggle_notifications_callback(callback: types.CallbackQuery):
+@dp.callback_query(NotifyCB.filter())
+async def toggle_notifications_callback(callback: types.CallbackQuery, callback_data: NotifyCB):
     """Обработчик callback-запросов для включения/выключения уведомлений"""
     try:
-        state = callback.data.split('_')[2]
-        success = bot.trading_bot.toggle_notifications(state == 'on')
-        
+        success = await asyncio.to_thread(_tb().toggle_notifications, callback_data.enabled)
+
         if success:
-            status = "включены" if state == 'on' else "выключены"
+            status = "включены" if callback_data.enabled else "выключены"
             await callback.answer(f"✅ Уведомления {status}")
         else:
             await callback.answer("❌ Не удалось изменить настройки уведомлений")
             
     except Exception as e:
-        logging.error(f"❌ Ошибка в toggle_notifications_callback: {e}")
+        logger.error("❌ Ошибка в toggle_notifications_callback: %s", e, exc_info=True)
         await callback.answer("❌ Произошла ошибка")
 
-@dp.callback_query(F.data.startswith('settings_rsi'))
-async def rsi_settings_callback(callback: types.CallbackQuery):
-    """Обработчик callback-запросов для настройки RSI"""
+# Статические меню настроек описаны таблицей: текст + готовая клавиатура.
+# Один рендер вместо шести одинаковых обработчиков, регистрация циклом
+# даёт роутеру точные фильтры (хэш-поиск, а не перебор startswith)
+MENU_CFG = {
+    'rsi': (
+        "📊 Выберите период RSI:\n\n"
+        "• 10 - более чувствительный\n"
+        "• 14 - стандартный\n"
+        "• 21 - менее чувствительный",
+        RSI_KB,
+    ),
+    'atr': (
+        "📈 Выберите период ATR:\n\n"
+        "• 10 - более чувствительный\n"
+        "• 14 - стандартный\n"
+        "• 21 - менее чувствительный",
+        ATR_KB,
+    ),
+    'sma': (
+        "📉 Выберите период SMA для настройки:\n\n"
+        "• SMA20 - короткий период\n"
+        "• SMA50 - длинный период",
+        SMA_KB,
+    ),
+    'position_size': (
+        "💰 Выберите размер позиции (% от баланса):\n\n"
+        "• 0.5% - консервативный\n"
+        "• 1.0% - стандартный\n"
+        "• 2.0% - агрессивный\n"
+        "• 5.0% - очень агрессивный",
+        POSITION_SIZE_KB,
+    ),
+    'stop_loss': (
+        "🛑 Выберите множитель стоп-лосса (ATR):\n\n"
+        "• 0.5 ATR - тесный стоп\n"
+        "• 1.0 ATR - стандартный\n"
+        "• 1.5 ATR - широкий стоп\n"
+        "• 2.0 ATR - очень широкий стоп",
+        STOP_LOSS_KB,
+    ),
+    'take_profit': (
+        "🎯 Выберите тейк-профит для настройки:\n\n"
+        "• TP1 - первый тейк-профит\n"
+        "• TP2 - второй тейк-профит\n"
+        "• TP3 - третий тейк-профит",
+        TP_SELECT_KB,
+    ),
+}
+
+async def show_menu(callback: types.CallbackQuery, menu_key: str):
+    """Единый рендер статических меню настроек"""
     try:
-        keyboard = types.InlineKeyboardMarkup()
-        keyboard.add(types.InlineKeyboardButton(
-            "10",
-            callback_data="set_rsi_10"
-        ))
-        keyboard.add(types.InlineKeyboardButton(
-            "14",
-            callback_data="set_rsi_14"
-        ))
-        keyboard.add(types.InlineKeyboardButton(
-            "21",
-            callback_data="set_rsi_21"
-        ))
-        
-        await callback.message.edit_text(
-            "📊 Выберите период RSI:\n\n"
-            "• 10 - более чувствительный\n"
-            "• 14 - стандартный\n"
-            "• 21 - менее чувствительный",
-            reply_markup=keyboard
-        )
+        text, kb = MENU_CFG[menu_key]
+        await scheduler.edit(callback.message, text, reply_markup=kb)
     except Exception as e:
-        logging.error(f"❌ Ошибка в rsi_settings_callback: {e}")
+        logger.error("❌ Ошибка в show_menu(%s): %s", menu_key, e, exc_info=True)
         await callback.answer("❌ Произошла ошибка")
 
-@dp.callback_query(F.data.startswith('set_rsi_'))
-async def set_rsi_callback(callback: types.CallbackQuery):
+for _key in MENU_CFG:
+    dp.callback_query.register(partial(show_menu, menu_key=_key), F.data == f"settings_{_key}")
+
+@dp.callback_query(RSIPeriodCB.filter())
+async def set_rsi_callback(callback: types.CallbackQuery, callback_data: RSIPeriodCB):
     """Обработчик callback-запросов для установки периода RSI"""
     try:
-        period = int(callback.data.split('_')[2])
-        success = bot.trading_bot.set_rsi_period(period)
-        
+        period = callback_data.period
+        success = await asyncio.to_thread(_tb().set_rsi_period, period)
+
         if success:
             await callback.answer(f"✅ Период RSI установлен на {period}")
         else:
             await callback.answer("❌ Не удалось установить период RSI")
             
     except Exception as e:
-        logging.error(f"❌ Ошибка в set_rsi_callback: {e}")
+        logger.error("❌ Ошибка в set_rsi_callback: %s", e, exc_info=True)
         await callback.answer("❌ Произошла ошибка")
 
-@dp.callback_query(F.data.startswith('settings_atr'))
-async def atr_settings_callback(callback: types.CallbackQuery):
-    """Обработчик callback-запросов для настройки ATR"""
-    try:
-        keyboard = types.InlineKeyboardMarkup()
-        keyboard.add(types.InlineKeyboardButton(
-            "10",
-            callback_data="set_atr_10"
-        ))
-        keyboard.add(types.InlineKeyboardButton(
-            "14",
-            callback_data="set_atr_14"
-        ))
-        keyboard.add(types.InlineKeyboardButton(
-            "21",
-            callback_data="set_atr_21"
-        ))
-        
-        await callback.message.edit_text(
-            "📈 Выберите период ATR:\n\n"
-            "• 10 - более чувствительный\n"
-            "• 14 - стандартный\n"
-            "• 21 - менее чувствительный",
-            reply_markup=keyboard
-        )
-    except Exception as e:
-        logging.error(f"❌ Ошибка в atr_settings_callback: {e}")
-        await callback.answer("❌ Произошла ошибка")
-
-@dp.callback_query(F.data.startswith('set_atr_'))
-async def set_atr_callback(callback: types.CallbackQuery):
+@dp.callback_query(ATRPeriodCB.filter())
+async def set_atr_callback(callback: types.CallbackQuery, callback_data: ATRPeriodCB):
     """Обработчик callback-запросов для установки периода ATR"""
     try:
-        period = int(callback.data.split('_')[2])
-        success = bot.trading_bot.set_atr_period(period)
-        
+        period = callback_data.period
+        success = await asyncio.to_thread(_tb().set_atr_period, period)
+
         if success:
             await callback.answer(f"✅ Период ATR установлен на {period}")
         else:
             await callback.answer("❌ Не удалось установить период ATR")
             
     except Exception as e:
-        logging.error(f"❌ Ошибка в set_atr_callback: {e}")
+        logger.error("❌ Ошибка в set_atr_callback: %s", e, exc_info=True)
         await callback.answer("❌ Произошла ошибка")
 
-@dp.callback_query(F.data.startswith('settings_sma'))
-async def sma_settings_callback(callback: types.CallbackQuery):
-    """Обработчик callback-запросов для настройки SMA"""
-    try:
-        keyboard = types.InlineKeyboardMarkup()
-        keyboard.add(types.InlineKeyboardButton(
-            "SMA20",
-            callback_data="set_sma_20"
-        ))
-        keyboard.add(types.InlineKeyboardButton(
-            "SMA50",
-            callback_data="set_sma_50"
-        ))
-        
-        await callback.message.edit_text(
-            "📉 Выберите период SMA для настройки:\n\n"
-            "• SMA20 - короткий период\n"
-            "• SMA50 - длинный период",
-            reply_markup=keyboard
-        )
-    except Exception as e:
-        logging.error(f"❌ Ошибка в sma_settings_callback: {e}")
-        await callback.answer("❌ Произошла ошибка")
-
-@dp.callback_query(F.data.startswith('set_sma_'))
-async def set_sma_callback(callback: types.CallbackQuery):
+@dp.callback_query(SMAPeriodCB.filter())
+async def set_sma_callback(callback: types.CallbackQuery, callback_data: SMAPeriodCB):
     """Обработчик callback-запросов для установки периода SMA"""
     try:
-        period = int(callback.data.split('_')[2])
-        success = bot.trading_bot.set_sma_period(period)
-        
+        period = callback_data.period
+        success = await asyncio.to_thread(_tb().set_sma_period, period)
+
         if success:
             await callback.answer(f"✅ Период SMA установлен на {period}")
         else:
             await callback.answer("❌ Не удалось установить период SMA")
             
     except Exception as e:
-        logging.error(f"❌ Ошибка в set_sma_callback: {e}")
-        await callback.answer("❌ Произошла ошибка")
-
-@dp.callback_query(F.data.startswith('settings_position_size'))
-async def position_size_settings_callback(callback: types.CallbackQuery):
-    """Обработчик callback-запросов для настройки размера позиции"""
-    try:
-        keyboard = types.InlineKeyboardMarkup()
-        keyboard.add(types.InlineKeyboardButton(
-            "0.5%",
-            callback_data="set_position_size_0.5"
-        ))
-        keyboard.add(types.InlineKeyboardButton(
-            "1.0%",
-            callback_data="set_position_size_1.0"
-        ))
-        keyboard.add(types.InlineKeyboardButton(
-            "2.0%",
-            callback_data="set_position_size_2.0"
-        ))
-        keyboard.add(types.InlineKeyboardButton(
-            "5.0%",
-            callback_data="set_position_size_5.0"
-        ))
-        
-        await callback.message.edit_text(
-            "💰 Выберите размер позиции (% от баланса):\n\n"
-            "• 0.5% - консервативный\n"
-            "• 1.0% - стандартный\n"
-            "• 2.0% - агрессивный\n"
-            "• 5.0% - очень агрессивный",
-            reply_markup=keyboard
-        )
-    except Exception as e:
-        logging.error(f"❌ Ошибка в position_size_settings_callback: {e}")
+        logger.error("❌ Ошибка в set_sma_callback: %s", e, exc_info=True)
         await callback.answer("❌ Произошла ошибка")
 
-@dp.callback_query(F.data.startswith('set_position_size_'))
-async def set_position_size_callback(callback: types.CallbackQuery):
+@dp.callback_query(PositionSizeCB.filter())
+async def set_position_size_callback(callback: types.CallbackQuery, callback_data: PositionSizeCB):
     """Обработчик callback-запросов для установки размера позиции"""
     try:
-        size = float(callback.data.split('_')[3])
-        success = bot.trading_bot.set_position_size(size)
+        size = callback_data.size
+        success = await asyncio.to_thread(_tb().set_position_size, size)
         
         if success:
             await callback.answer(f"✅ Размер позиции установлен на {size}%")
@@ -1115,49 +1211,15 @@ async def set_position_size_callback(callback: types.CallbackQuery):
             await callback.answer("❌ Не удалось установить размер позиции")
             
     except Exception as e:
-        logging.error(f"❌ Ошибка в set_position_size_callback: {e}")
+        logger.error("❌ Ошибка в set_position_size_callback: %s", e, exc_info=True)
         await callback.answer("❌ Произошла ошибка")
 
-@dp.callback_query(F.data.startswith('settings_stop_loss'))
-async def stop_loss_settings_callback(callback: types.CallbackQuery):
-    """Обработчик callback-запросов для настройки стоп-лосса"""
-    try:
-        keyboard = types.InlineKeyboardMarkup()
-        keyboard.add(types.InlineKeyboardButton(
-            "0.5 ATR",
-            callback_data="set_stop_loss_0.5"
-        ))
-        keyboard.add(types.InlineKeyboardButton(
-            "1.0 ATR",
-            callback_data="set_stop_loss_1.0"
-        ))
-        keyboard.add(types.InlineKeyboardButton(
-            "1.5 ATR",
-            callback_data="set_stop_loss_1.5"
-        ))
-        keyboard.add(types.InlineKeyboardButton(
-            "2.0 ATR",
-            callback_data="set_stop_loss_2.0"
-        ))
-        
-        await callback.message.edit_text(
-            "🛑 Выберите множитель стоп-лосса (ATR):\n\n"
-            "• 0.5 ATR - тесный стоп\n"
-            "• 1.0 ATR - стандартный\n"
-            "• 1.5 ATR - широкий стоп\n"
-            "• 2.0 ATR - очень широкий стоп",
-            reply_markup=keyboard
-        )
-    except Exception as e:
-        logging.error(f"❌ Ошибка в stop_loss_settings_callback: {e}")
-        await callback.answer("❌ Произошла ошибка")
-
-@dp.callback_query(F.data.startswith('set_stop_loss_'))
-async def set_stop_loss_callback(callback: types.CallbackQuery):
+@dp.callback_query(SLMultCB.filter())
+async def set_stop_loss_multiplier_callback(callback: types.CallbackQuery, callback_data: SLMultCB):
     """Обработчик callback-запросов для установки множителя стоп-лосса"""
     try:
-        multiplier = float(callback.data.split('_')[3])
-        success = bot.trading_bot.set_stop_loss_multiplier(multiplier)
+        multiplier = callback_data.mult
+        success = await asyncio.to_thread(_tb().set_stop_loss_multiplier, multiplier)
         
         if success:
             await callback.answer(f"✅ Множитель стоп-лосса установлен на {multiplier} ATR")
@@ -1165,62 +1227,22 @@ async def set_stop_loss_callback(callback: types.CallbackQuery):
             await callback.answer("❌ Не удалось установить множитель стоп-лосса")
             
     except Exception as e:
-        logging.error(f"❌ Ошибка в set_stop_loss_callback: {e}")
+        logger.error("❌ Ошибка в set_stop_loss_callback: %s", e, exc_info=True)
         await callback.answer("❌ Произошла ошибка")
 
-@dp.callback_query(F.data.startswith('settings_take_profit'))
-async def take_profit_settings_callback(callback: types.CallbackQuery):
-    """Обработчик callback-запросов для настройки тейк-профита"""
+@dp.callback_query(TPSelectCB.filter())
+async def take_profit_select_callback(callback: types.CallbackQuery, callback_data: TPSelectCB):
+    """Обработчик callback-запросов для выбора настраиваемого тейк-профита"""
     try:
-        keyboard = types.InlineKeyboardMarkup()
-        keyboard.add(types.InlineKeyboardButton(
-            "TP1",
-            callback_data="set_tp1"
-        ))
-        keyboard.add(types.InlineKeyboardButton(
-            "TP2",
-            callback_data="set_tp2"
-        ))
-        keyboard.add(types.InlineKeyboardButton(
-            "TP3",
-            callback_data="set_tp3"
-        ))
-        
-        await callback.message.edit_text(
-            "🎯 Выберите тейк-профит для настройки:\n\n"
-            "• TP1 - первый тейк-профит\n"
-            "• TP2 - второй тейк-профит\n"
-            "• TP3 - третий тейк-профит",
-            reply_markup=keyboard
-        )
-    except Exception as e:
-        logging.error(f"❌ Ошибка в take_profit_settings_callback: {e}")
-        await callback.answer("❌ Произошла ошибка")
-
-@dp.callback_query(F.data.startswith('set_tp'))
-async def set_take_profit_callback(callback: types.CallbackQuery):
-    """Обработчик callback-запросов для установки множителя тейк-профита"""
-    try:
-        tp_number = callback.data.split('_')[1]
-        keyboard = types.InlineKeyboardMarkup()
-        keyboard.add(types.InlineKeyboardButton(
-            "1.0 ATR",
-            callback_data=f"set_tp_multiplier_{tp_number}_1.0"
-        ))
-        keyboard.add(types.InlineKeyboardButton(
-            "1.5 ATR",
-            callback_data=f"set_tp_multiplier_{tp_number}_1.5"
-        ))
-        keyboard.add(types.InlineKeyboardButton(
-            "2.0 ATR",
-            callback_data=f"set_tp_multiplier_{tp_number}_2.0"
-        ))
-        keyboard.add(types.InlineKeyboardButton(
-            "2.5 ATR",
-            callback_data=f"set_tp_multiplier_{tp_number}_2.5"
-        ))
-        
-        await callback.message.edit_text(
+        tp_number = callback_data.tp_num
+        kb = InlineKeyboardBuilder()
+        for m in TP_MULTS:
+            kb.button(text=f"{m} ATR", callback_data=TPMultCB(tp_num=tp_number, mult=m))
+        kb.adjust(2)
+        keyboard = kb.as_markup()
+
+        await scheduler.edit(
+            callback.message,
             f"🎯 Выберите множитель для TP{tp_number} (ATR):\n\n"
             "• 1.0 ATR - тесный тейк\n"
             "• 1.5 ATR - стандартный\n"
@@ -1229,16 +1251,16 @@ async def set_take_profit_callback(callback: types.CallbackQuery):
             reply_markup=keyboard
         )
     except Exception as e:
-        logging.error(f"❌ Ошибка в set_take_profit_callback: {e}")
+        logger.error("❌ Ошибка в take_profit_select_callback: %s", e, exc_info=True)
         await callback.answer("❌ Произошла ошибка")
 
-@dp.callback_query(F.data.startswith('set_tp_multiplier_'))
-async def set_tp_multiplier_callback(callback: types.CallbackQuery):
+@dp.callback_query(TPMultCB.filter())
+async def set_tp_multiplier_callback(callback: types.CallbackQuery, callback_data: TPMultCB):
     """Обработчик callback-запросов для установки множителя тейк-профита"""
     try:
-        _, _, tp_number, multiplier = callback.data.split('_')
-        multiplier = float(multiplier)
-        success = bot.trading_bot.set_take_profit_multiplier(tp_number, multiplier)
+        tp_number = callback_data.tp_num
+        multiplier = callback_data.mult
+        success = await asyncio.to_thread(_tb().set_take_profit_multiplier, tp_number, multiplier)
         
         if success:
             await callback.answer(f"✅ Множитель TP{tp_number} установлен на {multiplier} ATR")
@@ -1246,12 +1268,12 @@ async def set_tp_multiplier_callback(callback: types.CallbackQuery):
             await callback.answer(f"❌ Не удалось установить множитель TP{tp_number}")
             
     except Exception as e:
-        logging.error(f"❌ Ошибка в set_tp_multiplier_callback: {e}")
+        logger.error("❌ Ошибка в set_tp_multiplier_callback: %s", e, exc_info=True)
         await callback.answer("❌ Произошла ошибка")
 
 async def main():
     """Главная функция запуска бота"""
-    logging.info("🚀 Запуск Telegram бота...")
+    logger.info("🚀 Запуск Telegram бота...")
     
     try:
         # Отправляем стартовое сообщение
@@ -1265,7 +1287,7 @@ async def main():
         await dp.start_polling(bot)
         
     except Exception as e:
-        logging.error(f"❌ Ошибка при запуске бота: {e}")
+        logger.error("❌ Ошибка при запуске бота: %s", e, exc_info=True)
         raise
 
 if __name__ == "__main__":
@@ -1,30 +1,88 @@
+from concurrent.futures import ThreadPoolExecutor
+
 from pybit.unified_trading import HTTP
+import numpy as np
 import pandas as pd
 import datetime
 
+# numba опционален: с ним цикл Уайлдера для ATR летит на C-скорости,
+# без него просто пропускаем быстрый путь
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+if HAS_NUMBA:
+    @njit(cache=True, fastmath=True)
+    def wilder_atr(high, low, close, n):
+        """ATR по Уайлдеру: сглаживание рекуррентное, чистой векторизацией не берётся"""
+        tr = np.empty_like(high)
+        atr = np.empty_like(high)
+        tr[0] = high[0] - low[0]
+        for i in range(1, len(high)):
+            tr[i] = max(high[i] - low[i], abs(high[i] - close[i - 1]), abs(low[i] - close[i - 1]))
+        atr[:n] = np.nan
+        atr[n - 1] = tr[:n].mean()
+        for i in range(n, len(high)):
+            atr[i] = (atr[i - 1] * (n - 1) + tr[i]) / n
+        return atr
+
 # Подключение к API Bybit (используй свои ключи, если нужно)
 session = HTTP(testnet=True)  # Для демо-версии
 
 # Запрос исторических данных с 15 марта 00:00
 symbol = "BTCUSDT"
 interval = "15"  # 15-минутные свечи
+limit = 500  # Максимальное число свечей за один запрос
+CHUNK_MS = limit * 15 * 60_000  # Окно одного запроса в миллисекундах
+
 start_time = int(datetime.datetime(2024, 3, 15, 0, 0).timestamp() * 1000)  # В миллисекундах
-limit = 500  # Максимальное число свечей
+end_time = int(datetime.datetime.now().timestamp() * 1000)
+
+
+def fetch_chunk(start):
+    """Качает одно окно из 500 свечей, начиная со start (мс)"""
+    response = session.get_kline(
+        category="linear",
+        symbol=symbol,
+        interval=interval,
+        start=start,
+        limit=limit
+    )
+    if response["retCode"] != 0:
+        print("❌ Ошибка при получении данных:", response)
+        return []
+    return response["result"]["list"]
+
 
-response = session.get_kline(
-    category="linear",
-    symbol=symbol,
-    interval=interval,
-    start=start_time,
-    limit=limit
-)
+# Окна независимы, а запрос сетевой (GIL отпускается на время ожидания),
+# поэтому качаем весь диапазон параллельно вместо одного вызова на 500 свечей
+starts = range(start_time, end_time, CHUNK_MS)
+with ThreadPoolExecutor(max_workers=8) as pool:
+    chunks = pool.map(fetch_chunk, starts)
+data = [row for chunk in chunks for row in chunk]
 
 # Обрабатываем данные
-if response["retCode"] == 0:
-    data = response["result"]["list"]
+if data:
     df = pd.DataFrame(data, columns=["timestamp", "open", "high", "low", "close", "volume", "turnover"])
-    df["timestamp"] = pd.to_datetime(df["timestamp"], unit="ms")  # Преобразуем время
-    df.to_csv("bybit_btcusdt_15m.csv", index=False)
-    print("✅ Данные сохранены в bybit_btcusdt_15m.csv")
+    float_cols = ["open", "high", "low", "close", "volume", "turnover"]
+    # float32 хватает для индикаторных прикидок, а памяти ест вдвое меньше
+    df[float_cols] = df[float_cols].astype("float32")
+    # pybit отдаёт метки времени строками; через int64 конвертация идёт
+    # векторным путём вместо object-парсера по значению
+    df["timestamp"] = pd.to_datetime(df["timestamp"].astype("int64"), unit="ms", utc=True)
+    df = df.sort_values("timestamp").drop_duplicates("timestamp").reset_index(drop=True)
+    if HAS_NUMBA and len(df) >= 14:
+        # Первая компиляция ~1 с, дальше O(N) нативным кодом
+        df["ATR"] = wilder_atr(
+            df["high"].to_numpy(np.float32),
+            df["low"].to_numpy(np.float32),
+            df["close"].to_numpy(np.float32),
+            14
+        )
+    # Parquet компактнее и читается pyarrow на порядок быстрее CSV
+    df.to_parquet("bybit_btcusdt_15m.parquet")
+    print("✅ Данные сохранены в bybit_btcusdt_15m.parquet")
 else:
-    print("❌ Ошибка при получении данных:", response)
+    print("❌ Не удалось получить ни одной свечи")